@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+import os
+import os.path
+import json
+import timeit
+import contextlib
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+
+import run
+from lang.packs import detect
+from vn.io import Reader, Writer
+from vn.statistics import Summary
+
+# Natural Language Processors of a worker process, loaded with the first project that uses them
+spacy_nlp = {}
+
+def main(projects, workers):
+	"""Runs Visual Narrator for multiple projects, spread over a pool of worker processes
+
+	:param projects: List of projects, each a dictionary with an input 'file', a system 'name' and a list of 'settings' (command line arguments)
+	:param workers: Number of worker processes
+	:returns: Run manifest with the results per project
+	"""
+	start_time = timeit.default_timer()
+	summary = Summary()
+
+	with ProcessPoolExecutor(max_workers=workers) as executor:
+		results = list(executor.map(run_project, projects))
+
+	for result in results:
+		project_summary = result.pop('summary')
+		if project_summary:
+			summary.merge(project_summary)
+		status = "FAILED (" + result['error'] + ")" if result['error'] else str(result['stories']) + " stories, " + str(result['failed']) + " failed"
+		print("[" + result['name'] + "] " + status + " in " + str(round(result['time'], 5)) + " s")
+
+	return {"projects": results, "workers": workers, "time": timeit.default_timer() - start_time, "summary": summary.toJSON()}
+
+def run_project(project):
+	"""Runs Visual Narrator for a single project in a worker process, writing its console output to
+	output/<system name>/log.txt. If the settings do not give a language, it is detected from the
+	indicators in the user stories.
+
+	:param project: Dictionary with an input 'file', a system 'name' and a list of 'settings'
+	:returns: Dictionary with the timings and number of (failed) user stories of the project
+	"""
+	start_time = timeit.default_timer()
+	result = {"file": project["file"], "name": project["name"], "settings": project["settings"], "stories": 0, "failed": 0, "error": None, "summary": None}
+
+	folder = "output/" + str(project["name"])
+	os.makedirs(folder, exist_ok=True)
+
+	# Errors in the settings of the project are printed to stderr, and also go to its log
+	with open(folder + "/log.txt", 'w') as log, contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+		try:
+			# The file is read once, and its (closed) file object only gives its name and encoding to the report
+			with open(project["file"]) as f:
+				stories = Reader.parse(f)
+			settings = project["settings"]
+			if "--lang" not in settings:
+				settings = settings + ["--lang", detect(stories)]
+			args = run.program("--return-args", "-n", project["name"], *settings)
+			if args.model not in spacy_nlp:
+				spacy_nlp[args.model] = run.initialize_nlp(args.model)
+			out = run.main_args(f, args, spacy_nlp[args.model], stories)
+			result["stories"] = len(out['us_instances'])
+			result["failed"] = len(out['failed_stories'])
+			result["times"] = out['times']
+			result["files"] = [f[1] for f in out['files']]
+			result["summary"] = out['summary']
+		except SystemExit as err:
+			# The arguments were rejected, with the reason in the log
+			result["error"] = "Invalid settings (see " + folder + "/log.txt)"
+		except Exception as err:
+			result["error"] = repr(err)
+
+	result["time"] = timeit.default_timer() - start_time
+	return result
+
+def read_projects(path, settings):
+	"""Reads the projects from a directory (one input file per project, named after the file) or
+	from a JSON manifest: a list of objects with a 'file', and optionally a 'name' and 'settings'
+
+	:param path: Directory or manifest file
+	:param settings: Default settings (command line arguments) for all projects
+	:returns: List of projects
+	"""
+	projects = []
+
+	if os.path.isdir(path):
+		for filename in sorted(os.listdir(path)):
+			if os.path.isfile(os.path.join(path, filename)) and not filename.startswith('.'):
+				projects.append({"file": os.path.join(path, filename), "name": os.path.splitext(filename)[0], "settings": list(settings)})
+	else:
+		with open(path) as f:
+			manifest = json.load(f)
+		for project in manifest:
+			filename = os.path.join(os.path.dirname(path), project["file"])
+			name = project.get("name", os.path.splitext(os.path.basename(filename))[0])
+			projects.append({"file": filename, "name": name, "settings": list(settings) + project.get("settings", [])})
+
+	return projects
+
+def program(*args):
+	p = ArgumentParser(
+		usage='''batch.py <INPUT DIRECTORY | MANIFEST> [-w WORKERS] [<run.py args>]
+
+Runs Visual Narrator for multiple projects: every file in the input directory,
+or every project in a JSON manifest, e.g.:
+	[{"file": "shop.txt", "name": "Shop", "settings": ["-t", "0.5", "--prolog"]}]
+Outputs are written to output/<system name>, and a run manifest with the
+timings and failures per project to output/batch.
+''')
+	p.add_argument("path", help="input directory or JSON manifest", metavar="INPUT DIRECTORY | MANIFEST")
+	p.add_argument("-w", "--workers", dest="workers", help="number of worker processes (INT, default = number of CPUs)", type=int, default=None)
+
+	if (len(args) < 1):
+		args, settings = p.parse_known_args()
+	else:
+		args, settings = p.parse_known_args(args)
+
+	projects = read_projects(args.path, settings)
+	manifest = main(projects, args.workers)
+
+	with Writer() as w:
+		outputfile = w.make_file("output/batch", "batch_manifest", "json", manifest)
+	print("Run manifest succesfully created at: \"" + outputfile + "\"")
+
+	return manifest
+
+
+if __name__ == "__main__":
+	program()
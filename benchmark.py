@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+
+import timeit
+from argparse import ArgumentParser
+
+import run
+from vn.io import Reader
+from vn.miner import StoryMiner, parse
+from vn.nlp import DEFAULT_MODEL
+from vn.utility import Printer
+
+# Mining modes, as (name, single_parse)
+MODES = [["Separate parses", False], ["Single parse", True]]
+
+# Mined parts that are compared between modes
+FIELDS = [["Functional role", lambda s: s.role.functional_role.main],
+		  ["Role compound", lambda s: s.role.functional_role.compound],
+		  ["Means main verb", lambda s: s.means.main_verb.main],
+		  ["Means main verb phrase", lambda s: s.means.main_verb.phrase],
+		  ["Means main object", lambda s: s.means.main_object.main],
+		  ["Means main object compound", lambda s: s.means.main_object.compound],
+		  ["Means compounds", lambda s: s.means.compounds],
+		  ["Ends subject", lambda s: s.ends.subject.main if s.has_ends else []],
+		  ["Ends main verb", lambda s: s.ends.main_verb.main if s.has_ends else []],
+		  ["Ends main object", lambda s: s.ends.main_object.main if s.has_ends else []],
+		  ["Ends compounds", lambda s: s.ends.compounds]]
+
+def main(stories, models, systemname, repeat=1):
+	"""Compares the throughput of the models and mining modes, and how often they agree with the
+	first mode of the first model
+
+	:param stories: List of user story texts
+	:param models: List of spaCy model names
+	:param systemname: Name of the system
+	:param repeat: Number of times each mode is run, of which the fastest run is reported
+	:returns: Results per model and mode
+	"""
+	results = []
+
+	for model in models:
+		start_time = timeit.default_timer()
+		nlp = run.initialize_nlp(model)
+		load_time = timeit.default_timer() - start_time
+
+		for name, single_parse in MODES:
+			times = []
+			for r in range(repeat):
+				mined, time = mine_all(stories, nlp, systemname, single_parse)
+				times.append(time)
+			results.append({"model": model, "load_time": load_time, "mode": name, "time": min(times), "mined": mined})
+
+	reference = results[0]["mined"]
+	for result in results:
+		result["failed"] = sum(1 for story in result["mined"] if isinstance(story, ValueError))
+		result["agreement"] = agreement(reference, result["mined"])
+
+	Printer.print_head("MINING BENCHMARK")
+	print(str(len(stories)) + " user stories, fastest of " + str(repeat) + " run(s)\n")
+	print('{:<4}'.format("#") + '{:<20}'.format("Model") + '{:>12}'.format("Load (s)") + '{:<20}'.format("  Mode") + '{:>12}'.format("Time (s)") + '{:>12}'.format("Stories/s") + '{:>10}'.format("Failed") + '{:>12}'.format("Agreement"))
+	for i, result in enumerate(results, 1):
+		print('{:<4}'.format(i) + '{:<20}'.format(result["model"]) + '{:>12.5f}'.format(result["load_time"]) + '{:<20}'.format("  " + result["mode"]) + '{:>12.5f}'.format(result["time"]) + '{:>12.1f}'.format(len(stories) / result["time"] if result["time"] else 0.0) +
+			  '{:>10}'.format(result["failed"]) + '{:>11.1f}%'.format(result["agreement"]["All"] * 100))
+
+	Printer.print_subhead("Agreement with #1 per part")
+	print('{:<30}'.format("Part") + ''.join(['{:>8}'.format("#" + str(i)) for i in range(2, len(results) + 1)]))
+	for field in [f[0] for f in FIELDS]:
+		print('{:<30}'.format(field) + ''.join(['{:>7.1f}%'.format(result["agreement"][field] * 100) for result in results[1:]]))
+
+	return results
+
+def mine_all(stories, nlp, systemname, single_parse):
+	miner = StoryMiner(single_parse)
+	mined = []
+
+	start_time = timeit.default_timer()
+	for us_id, s in enumerate(stories, 1):
+		try:
+			mined.append(parse(s, us_id, systemname, nlp, miner))
+		except ValueError as err:
+			mined.append(err)
+
+	return mined, timeit.default_timer() - start_time
+
+def agreement(reference, mined):
+	"""Fraction of the user stories for which the mined parts are the same as in the reference,
+	where a user story agrees if it failed with the same error in both
+
+	:param reference: List of mined user stories (or errors)
+	:param mined: List of mined user stories (or errors)
+	:returns: Dictionary of the agreement per field, and for all fields ('All')
+	"""
+	counts = {field[0]: 0 for field in FIELDS}
+	counts["All"] = 0
+
+	for a, b in zip(reference, mined):
+		if isinstance(a, ValueError) or isinstance(b, ValueError):
+			same = type(a) is type(b) and a.args == b.args
+			for field in counts:
+				counts[field] += same
+			continue
+
+		all_same = True
+		for field, get in FIELDS:
+			same = as_text(get(a)) == as_text(get(b))
+			counts[field] += same
+			all_same = all_same and same
+		counts["All"] += all_same
+
+	return {field: count / len(reference) if reference else 1.0 for field, count in counts.items()}
+
+def as_text(value):
+	# TokenLists are lists too, and their tokens compare by offset, also across documents
+	if isinstance(value, list) or (hasattr(value, 'doc') and not hasattr(value, 'i')):
+		return [as_text(v) for v in value]
+	if hasattr(value, 'text'):
+		return value.text
+	return value
+
+def program(*args):
+	p = ArgumentParser(
+		usage='''benchmark.py <INPUT FILE> [-n SYSTEM NAME] [-m MODELS] [-r REPEAT]
+
+Compares the throughput of mining each part of a user story from a separate
+parse with mining all parts from a single parse, for one or more spaCy models,
+and how often they give the same role, means and ends as the first model and
+mode.
+''')
+	p.add_argument("filename", help="input file with user stories", metavar="INPUT FILE", type=lambda x: run.is_valid_file(p, x))
+	p.add_argument("-n", "--name", dest="system_name", help="your system name (default = System)", default="System")
+	p.add_argument("-m", "--models", dest="models", help="comma-separated spaCy models to compare (default = " + DEFAULT_MODEL + ")", default=DEFAULT_MODEL)
+	p.add_argument("-r", "--repeat", dest="repeat", help="number of runs per mode, of which the fastest is reported (INT, default = 1)", type=int, default=1)
+
+	if (len(args) < 1):
+		args = p.parse_args()
+	else:
+		args = p.parse_args(args)
+
+	stories = Reader.parse(args.filename)
+	return main(stories, args.models.split(','), args.system_name, args.repeat)
+
+
+if __name__ == "__main__":
+	program()
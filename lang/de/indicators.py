@@ -0,0 +1,25 @@
+''' German indicators, following the English indicators taken from AQUSA.
+'''
+
+
+ROLE_INDICATORS = ["Als ein", "Als eine", "Als"]
+MEANS_INDICATORS = ["möchte ich", "möchte ich gerne", "will ich", "kann ich", "würde ich gerne", "muss ich"]
+ENDS_INDICATORS = ["Damit", "Um", "Sodass", "So dass", "Weil"]
+
+CONJUNCTIONS = [' und ', '&', '+', ' oder ']
+
+''' Words used to simplify and mine the parts of a user story
+'''
+
+MODEL = "de_core_news_md"
+PRONOUN = "ich"
+MODAL = "kann"
+MEANS_PREFIX = "Ich kann"
+ABLE_TO = ["ich bin in der Lage"]
+WITH = ["mit"]
+
+''' Separable particles, which take the place of English phrasal verb particles
+'''
+
+TYPE_II_PARTICLES = ['an', 'auf', 'aus', 'ab']
+TYPE_II_PARTICLES_MARGINAL = ['ein', 'mit', 'zu', 'zurück', 'weg']
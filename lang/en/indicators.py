@@ -11,6 +11,16 @@ ENDS_INDICATORS = ["So that", "In order to", "So", "Because of"]
 
 CONJUNCTIONS = [' and ', '&', '+', ' or ']
 
+''' Words used to simplify and mine the parts of a user story
+'''
+
+MODEL = "en_core_web_md"
+PRONOUN = "I"
+MODAL = "can"
+MEANS_PREFIX = "I can"
+ABLE_TO = ["I am able to"]
+WITH = ["with", "w/"]
+
 ''' Based on indicators for particles of phrasal verbs type II, Wei Li et al., 2003 
 '''
 
@@ -0,0 +1,26 @@
+''' Dutch indicators, following the English indicators taken from AQUSA.
+'''
+
+
+ROLE_INDICATORS = ["Als een", "Als de", "Als"]
+MEANS_INDICATORS = ["wil ik", "wil ik graag", "wil ik kunnen", "kan ik", "moet ik kunnen", "zou ik graag willen", "zou ik willen"]
+ENDS_INDICATORS = ["Zodat", "Om", "Omdat"]
+
+CONJUNCTIONS = [' en ', '&', '+', ' of ']
+
+''' Words used to simplify and mine the parts of a user story
+'''
+
+# spaCy 1.x has no Dutch model; nl_core_news_sm needs spaCy 2, so the model is given with --model
+MODEL = None
+PRONOUN = "ik"
+MODAL = "kan"
+MEANS_PREFIX = "Ik kan"
+ABLE_TO = ["ik ben in staat om"]
+WITH = ["met"]
+
+''' Separable particles, which take the place of English phrasal verb particles
+'''
+
+TYPE_II_PARTICLES = ['op', 'af', 'uit', 'aan']
+TYPE_II_PARTICLES_MARGINAL = ['in', 'mee', 'terug', 'weg']
@@ -0,0 +1,104 @@
+''' Registry of the language packs in lang/<code>/indicators.py, which are loaded once and compiled
+into matchers when they are first used.
+'''
+
+import os
+import re
+import importlib
+
+DEFAULT_LANGUAGE = "en"
+
+_packs = {}
+
+class LanguagePack(object):
+	def __init__(self, code):
+		indicators = importlib.import_module("lang." + code + ".indicators")
+
+		self.code = code
+		self.model = indicators.MODEL
+		self.pronoun = indicators.PRONOUN
+		self.modal = str.lower(indicators.MODAL)
+		self.means_prefix = indicators.MEANS_PREFIX
+		self.able_to = [str.lower(a) for a in indicators.ABLE_TO]
+		self.with_words = [str.lower(w) for w in indicators.WITH]
+		self.conjunctions = indicators.CONJUNCTIONS
+		self.particles = indicators.TYPE_II_PARTICLES + indicators.TYPE_II_PARTICLES_MARGINAL
+
+		# The role indicator is followed by a space, the means and ends indicators are surrounded by spaces
+		self.indicators = {}
+		self.matchers = {}
+		self.compile('role', indicators.ROLE_INDICATORS, '')
+		self.compile('means', indicators.MEANS_INDICATORS, ' ')
+		self.compile('ends', indicators.ENDS_INDICATORS, ' ')
+
+	def default_model(self):
+		"""
+		:returns: Name of the spaCy model of the language
+		:raises ValueError: If there is no model of the language for the supported spaCy version
+		"""
+		if not self.model:
+			raise ValueError("There is no spaCy 1.x model for the language '" + self.code + "' (see lang/" + self.code + "/indicators.py), give one with --model")
+		return self.model
+
+	def compile(self, part, indicators, before):
+		self.indicators[part] = {}
+		for indicator in indicators:
+			self.indicators[part].setdefault(str.lower(indicator), indicator)
+
+		# At the same position, the longest indicator matches first (and of equally long ones the first listed)
+		alternatives = sorted(self.indicators[part], key=len, reverse=True)
+		self.matchers[part] = re.compile(re.escape(before) + "(" + "|".join([re.escape(a) for a in alternatives]) + ") ")
+
+	def find(self, part, sentence):
+		"""Finds the indicator of a part of a user story that occurs first in the sentence, taking the
+		longest indicator if multiple start there
+
+		:param part: 'role', 'means' or 'ends'
+		:param sentence: The user story sentence
+		:returns: The indicator and the index at which it was found, or '' and -1
+		"""
+		match = self.matchers[part].search(str.lower(sentence))
+		if match:
+			return self.indicators[part][match.group(1)], match.start()
+		return '', -1
+
+	def score(self, lines):
+		"""
+		:param lines: List of user story texts
+		:returns: Number of lines with both a role and a means indicator in this language
+		"""
+		return sum(1 for line in lines if self.find('role', line)[1] > -1 and self.find('means', line)[1] > -1)
+
+
+def get_pack(code=DEFAULT_LANGUAGE):
+	"""Gets a language pack, which is loaded the first time it is used
+
+	:param code: Language code, e.g. 'en'
+	:returns: LanguagePack
+	"""
+	if code not in _packs:
+		_packs[code] = LanguagePack(code)
+	return _packs[code]
+
+def available():
+	"""
+	:returns: Codes of the languages that have a pack
+	"""
+	folder = os.path.dirname(os.path.abspath(__file__))
+	return sorted([code for code in os.listdir(folder) if os.path.isfile(os.path.join(folder, code, "indicators.py"))])
+
+def detect(lines):
+	"""Detects the language of a set of user stories from their indicators, without loading any model
+
+	:param lines: List of user story texts
+	:returns: Code of the language in which the most lines have a role and means indicator (English if none have)
+	"""
+	best = DEFAULT_LANGUAGE
+	best_score = get_pack(DEFAULT_LANGUAGE).score(lines)
+
+	for code in available():
+		score = get_pack(code).score(lines)
+		if score > best_score:
+			best, best_score = code, score
+
+	return best
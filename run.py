@@ -1,73 +1,131 @@
 #!/usr/bin/env python
 
 import sys
+import copy
 import string
 import os.path
 import timeit
 import pkg_resources
+from functools import lru_cache
 
 from argparse import ArgumentParser
 import spacy
-import en_core_web_md
 from jinja2 import FileSystemLoader, Environment, PackageLoader
 
-from vn.io import Reader, Writer
-from vn.miner import StoryMiner
+from lang.packs import DEFAULT_LANGUAGE, available, get_pack
+from vn.io import Reader, Writer, Exporter
+from vn.corpus import Corpus
+from vn.duplicates import Duplicates, MinHash
+from vn.miner import StoryMiner, parse
+from vn.nlp import DEFAULT_MODEL, load_backend
 from vn.matrix import Matrix
+from vn.memory import release_docs, peak_rss
+from vn.progress import Progress, get_progress
 from vn.userstory import UserStory
-from vn.utility import Printer, multiline, remove_punct, t, is_i, tab, is_comment, occurence_list, is_us
+from vn.utility import Printer, Vocabulary, multiline, normalize, t, is_i, tab, is_comment, occurence_list, is_us, pos_tags
 from vn.pattern import Constructor
-from vn.statistics import Statistics, Counter
+from vn.statistics import Statistics, Counter, Summary
 
 
-def initialize_nlp():
+def initialize_nlp(model=DEFAULT_MODEL, annotations=None):
 	# Initialize spaCy just once (this takes most of the time...)
 	print("Initializing Natural Language Processor. . .")
-	nlp = en_core_web_md.load()
-	return nlp
+	if annotations and not os.path.exists(annotations):
+		return load_backend(model, cache=True)
+	return load_backend(model, filename=annotations)
 
-def main(filename, systemname, print_us, print_ont, statistics, link, prolog, json, per_role, threshold, base, weights, spacy_nlp):
+def main(filename, systemname, print_us, print_ont, statistics, link, prolog, json, per_role, threshold, base, weights, spacy_nlp, compress=False, report=True, report_limit=None, columnar=False, save_corpus=False, near_duplicates=None, single_parse=False, lang=DEFAULT_LANGUAGE, matrix_workers=1, memory_budget=False, progress=None, max_tokens=None, time_budget=None, deadline=None, stories=None):
 
 	"""General class to run the entire program
 	"""
 
+	if not progress:
+		progress = Progress()
+
 	start_nlp_time = timeit.default_timer()
 	nlp = spacy_nlp
 	nlp_time = timeit.default_timer() - start_nlp_time
 
 	start_parse_time = timeit.default_timer()
-	miner = StoryMiner()
+	start_rss = peak_rss()
+	miner = StoryMiner(single_parse, lang, max_tokens, time_budget)
+	# Time after which the remaining user stories are skipped
+	end_time = start_nlp_time + deadline if deadline is not None else None
 
-	# Read the input file
-	set = Reader.parse(filename)
+	# Read the input file, unless its user stories were read already
+	set = stories if stories is not None else Reader.parse(filename)
 	us_id = 1
 
 	# Keep track of all errors	
 	success = 0
 	fail = 0
-	list_of_fails = []
 	errors = ""
+	skipped = 0
 	c = Counter()
+	summary = Summary()
 
 	# Keeps track of all succesfully created User Stories objects
 	us_instances = []  
 	failed_stories = []
 	success_stories = []
 
+	# Mine each unique user story once, and copy the result (or error) for its duplicates
+	mined = {}
+	texts = []
+
 	# Parse every user story (remove punctuation and mine)
-	for s in set:
+	for s in progress.track("mining", set):
+		key = normalize(s)
+		texts.append([us_id, key])
 		try:
-			user_story = parse(s, us_id, systemname, nlp, miner)
-			user_story = c.count(user_story)
+			if end_time is not None and timeit.default_timer() > end_time:
+				raise ValueError('Skipped after the deadline of the run', 7)
+			if key in mined:
+				if isinstance(mined[key], ValueError):
+					raise ValueError(*mined[key].args)
+				user_story = mined[key].clone(us_id, s)
+				if memory_budget:
+					# The documents are released, so the duplicate gets the counts of the user story it copies
+					user_story.stats = copy.deepcopy(mined[key].stats)
+			else:
+				try:
+					user_story = parse(s, us_id, systemname, nlp, miner)
+				except ValueError as err:
+					mined[key] = err
+					raise
+				mined[key] = user_story
+				if memory_budget:
+					# Count the user story while it has its documents, and release them
+					release_docs(c.count(user_story))
 			success = success + 1
 			us_instances.append(user_story)
 			success_stories.append(s)
 		except ValueError as err:
 			failed_stories.append([us_id, s, err.args])
-			errors += "\n[User Story " + str(us_id) + " ERROR] " + str(err.args[0]) + "! (\"" + " ".join(str.split(s)) + "\")"
+			summary.add_failure(err)
+			if err.args[1:] == (7,):
+				skipped = skipped + 1
+			else:
+				errors += "\n[User Story " + str(us_id) + " ERROR] " + str(err.args[0]) + "! (\"" + " ".join(str.split(s)) + "\")"
 			fail = fail + 1
 		us_id = us_id + 1
 
+	if skipped:
+		errors += "\n[DEADLINE] Skipped the last " + str(skipped) + " User Stories, as the deadline of " + str(deadline) + " s passed"
+
+	if not memory_budget:
+		c.count_all(us_instances)
+	for user_story in us_instances:
+		summary.add(user_story)
+
+	# Flag duplicate and, if chosen, near-duplicate user stories
+	duplicates = [[True, 1.0, ids] for ids in Duplicates.exact(texts)]
+	if near_duplicates is not None:
+		copies = frozenset([us_id for exact, similarity, ids in duplicates for us_id in ids[1:]])
+		near = MinHash(near_duplicates).groups([text for text in texts if text[0] not in copies])
+		duplicates.extend([[False, similarity, ids] for similarity, ids in near])
+	duplicates = [[exact, similarity, [[us_id, " ".join(str.split(set[us_id - 1]))] for us_id in ids]] for exact, similarity, ids in duplicates]
+
 	# Print errors (if found)
 	if errors:
 		Printer.print_head("PARSING ERRORS")
@@ -78,8 +136,10 @@ def main(filename, systemname, print_us, print_ont, statistics, link, prolog, js
 	# Generate the term-by-user story matrix (m), and additional data in two other matrices
 	start_matr_time = timeit.default_timer()
 
-	matrix = Matrix(base, weights)
-	matrices = matrix.generate(us_instances, ' '.join([u.sentence for u in us_instances]), nlp)
+	# One vocabulary of the mined cases is shared by the matrices and the ontology
+	vocabulary = Vocabulary()
+	matrix = Matrix(base, weights, matrix_workers, progress)
+	matrices = matrix.generate(us_instances, ' '.join([u.sentence for u in us_instances]), nlp, vocabulary)
 	m, count_matrix, stories_list, rme = matrices
 
 	matr_time = timeit.default_timer() - start_matr_time
@@ -93,10 +153,14 @@ def main(filename, systemname, print_us, print_ont, statistics, link, prolog, js
 	# Generate the ontology
 	start_gen_time = timeit.default_timer()
 	
-	patterns = Constructor(nlp, us_instances, m)
-	out = patterns.make(systemname, threshold, link)
+	patterns = Constructor(nlp, us_instances, m, progress, vocabulary)
+	out = patterns.make(systemname, threshold, link, per_role)
 	output_ontology, output_prolog, output_ontobj, output_prologobj, onto_per_role = out
 
+	# The matrices are indexed by the ids of the cases, and by the cases themselves in the output
+	m = matrix.named(m, vocabulary)
+	count_matrix = matrix.named(count_matrix, vocabulary)
+
 	# Print out the ontology in the terminal, if argument '-o'/'--print_ont' is chosen
 	if print_ont:
 		Printer.print_head("MANCHESTER OWL")
@@ -109,10 +173,10 @@ def main(filename, systemname, print_us, print_ont, statistics, link, prolog, js
 	if statistics:
 		start_stats_time = timeit.default_timer()
 
-		statsarr = Statistics.to_stats_array(us_instances)
+		statsarr = Statistics.to_stats_frame(us_instances)
 
 		Printer.print_head("USER STORY STATISTICS")
-		Printer.print_stats(statsarr[0], True)
+		Printer.print_stats(statsarr[0], True, summary)
 		Printer.print_stats(statsarr[1], True)
 		Printer.print_subhead("Term - by - User Story Matrix ( Terms w/ total weight 0 hidden )")
 		hide_zero = m[(m['sum'] > 0)]
@@ -121,64 +185,69 @@ def main(filename, systemname, print_us, print_ont, statistics, link, prolog, js
 		stats_time = timeit.default_timer() - start_stats_time	
 
 	# Write output files
-	w = Writer()
-
-	folder = "output/" + str(systemname)
-	reports_folder = folder + "/reports"
-	stats_folder = reports_folder + "/stats"
-
-	outputfile = w.make_file(folder + "/ontology", str(systemname), "omn", output_ontology)
-	files = [["Manchester Ontology", outputfile]]
-
-	outputcsv = ""
-	sent_outputcsv = ""
-	matrixcsv = ""
-
-	if statistics:
-		files.append(["General statistics", w.make_file(stats_folder, str(systemname), "csv", statsarr[0])])
-		files.append(["Term-by-User Story matrix", w.make_file(stats_folder, str(systemname) + "-term_by_US_matrix", "csv", m)])
-		files.append(["Sentence statistics", w.make_file(stats_folder, str(systemname) + "-sentences", "csv", statsarr[1])])
-	if prolog:
-		files.append(["Prolog", w.make_file(folder + "/prolog", str(systemname), "pl", output_prolog)])
-	if json:
-		output_json_li = [str(us.toJSON()) for us in us_instances]
-		output_json = "\n".join(output_json_li)
-		files.append(["JSON", w.make_file(folder + "/json", str(systemname) + "-user_stories", "json", output_json)])
-	if per_role:
-		for o in onto_per_role:
-			files.append(["Individual Ontology for '" + str(o[0]) + "'", w.make_file(folder + "/ontology", str(systemname) + "-" + str(o[0]), "omn", o[1])])
-
-	# Print the used ontology generation settings
-	Printer.print_gen_settings(matrix, base, threshold)
-
-	# Print details of the generation
-	Printer.print_details(fail, success, nlp_time, parse_time, matr_time, gen_time, stats_time)
-
-	report_dict = {
-		"stories": us_instances,
-		"failed_stories": failed_stories,
-		"systemname": systemname,
-		"us_success": success,
-		"us_fail": fail,
-		"times": [["Initializing Natural Language Processor (<em>spaCy</em> v" + pkg_resources.get_distribution("spacy").version + ")" , nlp_time], ["Mining User Stories", parse_time], ["Creating Factor Matrix", matr_time], ["Generating Manchester Ontology", gen_time], ["Gathering statistics", stats_time]],
-		"dir": os.path.dirname(os.path.realpath(__file__)),
-		"inputfile": filename,
-		"inputfile_lines": len(set),
-		"outputfiles": files,
-		"threshold": threshold,
-		"base": base,
-		"matrix": matrix,
-		"weights": m['sum'].copy().reset_index().sort_values(['sum'], ascending=False).values.tolist(),
-		"counts": count_matrix.reset_index().values.tolist(),
-		"classes": output_ontobj.classes,
-		"relationships": output_prologobj.relationships,
-		"types": list(count_matrix.columns.values),
-		"ontology": multiline(output_ontology)
-	}
-
-	# Finally, generate a report
-	report = w.make_file(reports_folder, str(systemname) + "_REPORT", "html", generate_report(report_dict))
-	files.append(["Report", report])
+	# The writer waits for the files in the background, and stops its threads also if the run fails
+	with Writer(compress) as w:
+		folder = "output/" + str(systemname)
+		reports_folder = folder + "/reports"
+		stats_folder = reports_folder + "/stats"
+
+		outputfile = w.make_file(folder + "/ontology", str(systemname), "omn", output_ontology)
+		files = [["Manchester Ontology", outputfile]]
+
+		if statistics:
+			files.append(["General statistics", w.make_file(stats_folder, str(systemname), "csv", statsarr[0])])
+			files.append(["Term-by-User Story matrix", w.make_file(stats_folder, str(systemname) + "-term_by_US_matrix", "csv", m)])
+			files.append(["Sentence statistics", w.make_file(stats_folder, str(systemname) + "-sentences", "csv", statsarr[1])])
+			files.append(["Summary statistics", w.make_file(stats_folder, str(systemname) + "-summary", "csv", summary.to_rows())])
+			files.append(["Summary statistics (JSON)", w.make_file(stats_folder, str(systemname) + "-summary", "json", summary.toJSON())])
+		if prolog:
+			files.append(["Prolog", w.make_file(folder + "/prolog", str(systemname), "pl", output_prolog)])
+		if json:
+			files.append(["JSON", w.make_file(folder + "/json", str(systemname) + "-user_stories", "jsonl", Exporter.jsonl(us_instances))])
+		if columnar:
+			files.append(["Columnar", w.make_file(folder + "/json", str(systemname) + "-user_stories", "npz", Exporter.columns(us_instances))])
+		if save_corpus:
+			files.append(["Mined corpus", w.make_file(folder + "/corpus", str(systemname), "vnc", Corpus.dump(us_instances))])
+		if per_role:
+			for o in onto_per_role:
+				files.append(["Individual Ontology for '" + str(o[0]) + "'", w.make_file(folder + "/ontology", str(systemname) + "-" + str(o[0]), "omn", o[1])])
+
+		# Print the used ontology generation settings
+		Printer.print_gen_settings(matrix, base, threshold)
+
+		# Print details of the generation
+		Printer.print_details(fail, success, nlp_time, parse_time, matr_time, gen_time, stats_time)
+		if memory_budget:
+			Printer.print_memory(peak_rss(), start_rss, success)
+
+		if report:
+			report_dict = {
+				"stories": progress.track("report", us_instances[:report_limit]),
+				"stories_hidden": max(0, len(us_instances) - report_limit) if report_limit is not None else 0,
+				"failed_stories": failed_stories,
+				"duplicates": duplicates,
+				"systemname": systemname,
+				"us_success": success,
+				"us_fail": fail,
+				"times": [["Initializing Natural Language Processor (<em>spaCy</em> v" + pkg_resources.get_distribution("spacy").version + ", " + str(getattr(nlp, 'name', '')) + ")" , nlp_time], ["Mining User Stories", parse_time], ["Creating Factor Matrix", matr_time], ["Generating Manchester Ontology", gen_time], ["Gathering statistics", stats_time]],
+				"dir": os.path.dirname(os.path.realpath(__file__)),
+				"inputfile": filename,
+				"inputfile_lines": len(set),
+				"outputfiles": files,
+				"threshold": threshold,
+				"base": base,
+				"matrix": matrix,
+				"weights": m['sum'].copy().reset_index().sort_values(['sum'], ascending=False).values.tolist(),
+				"counts": count_matrix.reset_index().values.tolist(),
+				"classes": output_ontobj.classes,
+				"relationships": output_prologobj.relationships,
+				"types": list(count_matrix.columns.values),
+				"ontology": multiline(output_ontology)
+			}
+
+			# Finally, generate a report
+			report_file = w.make_file(reports_folder, str(systemname) + "_REPORT", "html", generate_report(report_dict))
+			files.append(["Report", report_file])
 
 	# Print the location and name of all output files
 	for file in files:
@@ -186,39 +255,26 @@ def main(filename, systemname, print_us, print_ont, statistics, link, prolog, js
 			print(str(file[0]) + " file succesfully created at: \"" + str(file[1]) + "\"")
 	
 	# Return objects so that they can be used as input for other tools
-	return {'us_instances': us_instances, 'output_ontobj': output_ontobj, 'output_prologobj': output_prologobj, 'matrix': m}
+	return {'us_instances': us_instances, 'output_ontobj': output_ontobj, 'output_prologobj': output_prologobj, 'matrix': m,
+			'failed_stories': failed_stories, 'duplicates': duplicates, 'summary': summary, 'files': files,
+			'times': {'nlp': nlp_time, 'parse': parse_time, 'matrix': matr_time, 'generation': gen_time, 'statistics': stats_time},
+			'peak_rss': peak_rss()}
 
 
-def parse(text, id, systemname, nlp, miner):
-	"""Create a new user story object and mines it to map all data in the user story text to a predefined model
-	
-	:param text: The user story text
-	:param id: The user story ID, which can later be used to identify the user story
-	:param systemname: Name of the system this user story belongs to
-	:param nlp: Natural Language Processor (spaCy)
-	:param miner: instance of class Miner
-	:returns: A new user story object
-	"""
-	no_punct = remove_punct(text)
-	no_double_space = ' '.join(no_punct.split())
-	doc = nlp(no_double_space)
-	user_story = UserStory(id, text, no_double_space)
-	user_story.system.main = nlp(systemname)[0]
-	user_story.data = doc
-	#Printer.print_dependencies(user_story)
-	#Printer.print_noun_phrases(user_story)
-	miner.structure(user_story)
-	user_story.old_data = user_story.data
-	user_story.data = nlp(user_story.sentence)
-	miner.mine(user_story, nlp)
-	return user_story
-	
 def generate_report(report_dict):
 	"""Generates a report using Jinja2
 	
 	:param report_dict: Dictionary containing all variables used in the report
 	:returns: HTML page
 	"""
+	return get_report_template().render(report_dict)
+
+@lru_cache(maxsize=None)
+def get_report_template():
+	"""Loads and compiles the report template once per process
+
+	:returns: Jinja2 template of the report
+	"""
 	CURR_DIR = os.path.dirname(os.path.abspath(__file__))
 
 	loader = FileSystemLoader( searchpath=str(CURR_DIR) + "/templates/" )
@@ -228,19 +284,39 @@ def generate_report(report_dict):
 	env.globals['apply_tab'] = tab
 	env.globals['is_comment'] = is_comment
 	env.globals['occurence_list'] = occurence_list
+	env.globals['pos_tags'] = pos_tags
 	env.tests['is_us'] = is_us
-	template = env.get_template("report.html")
 
-	return template.render(report_dict)
+	return env.get_template("report.html")
 
 
 def call(filename, spacy_nlp):
 	args2 = program("--return-args")
-	weights = [args2.weight_func_role, args2.weight_main_obj, args2.weight_ff_means, args2.weight_ff_ends,
-			   args2.weight_compound]
 	filename = open(filename)
-	return main(filename, args2.system_name, args2.print_us, args2.print_ont, args2.statistics, args2.link, args2.prolog,
-				args2.json, args2.per_role, args2.threshold, args2.base_weight, weights, spacy_nlp)
+	return main_args(filename, args2, spacy_nlp)
+
+
+def main_args(filename, args, spacy_nlp, stories=None):
+	"""Runs the program for parsed command line arguments
+
+	:param filename: An open input file
+	:param args: Arguments as returned by program("--return-args", ...)
+	:param spacy_nlp: Natural Language Processor (spaCy)
+	:param stories: Lines of the input file as read by Reader.parse, if they were read already
+	:returns: Objects that can be used as input for other tools
+	"""
+	weights = [args.weight_func_role, args.weight_main_obj, args.weight_ff_means, args.weight_ff_ends, args.weight_compound]
+	progress = get_progress(args.progress, args.progress_file, args.progress_interval)
+	try:
+		return main(filename, args.system_name, args.print_us, args.print_ont, args.statistics, args.link, args.prolog,
+				args.json, args.per_role, args.threshold, args.base_weight, weights, spacy_nlp, compress=args.compress,
+				report=not args.no_report, report_limit=args.report_limit, columnar=args.columnar,
+				save_corpus=args.save_corpus, near_duplicates=args.near_duplicates,
+				single_parse=args.single_parse, lang=args.lang, matrix_workers=args.matrix_workers,
+				memory_budget=args.memory_budget, progress=progress, max_tokens=args.max_tokens,
+				time_budget=args.time_budget, deadline=args.deadline, stories=stories)
+	finally:
+		progress.close()
 
 
 def program(*args):
@@ -273,14 +349,32 @@ This program has multiple functionalities:
 	g_p.add_argument("-l", "--link", dest="link", help="link ontology classes to user story they originate from", action="store_true", default=False)
 	g_p.add_argument("--prolog", dest="prolog", help="generate prolog output (.pl)", action="store_true", default=False)
 	g_p.add_argument("--return-args", dest="return_args", help="return arguments instead of call VN", action="store_true", default=False)
-	g_p.add_argument("--json", dest="json", help="export user stories as json (.json)", action="store_true", default=False)
+	g_p.add_argument("--json", dest="json", help="export user stories as json lines (.jsonl)", action="store_true", default=False)
+	g_p.add_argument("--columnar", dest="columnar", help="export user stories as columns of NumPy arrays (.npz)", action="store_true", default=False)
+	g_p.add_argument("--save-corpus", dest="save_corpus", help="save the mined user stories, so that they can be loaded without mining them again (.vnc)", action="store_true", default=False)
+	g_p.add_argument("--single-parse", dest="single_parse", help="parse each user story once, and mine its role, means and ends from that parse", action="store_true", default=False)
+	g_p.add_argument("--model", dest="model", help="spaCy model to use, e.g. en_core_web_sm for a faster but less accurate run (default = the model of the language, " + DEFAULT_MODEL + " for English)", default=None)
+	g_p.add_argument("--lang", dest="lang", help="language of the user stories, which sets the role, means and ends indicators (default = " + DEFAULT_LANGUAGE + ")", choices=available(), default=DEFAULT_LANGUAGE)
+	g_p.add_argument("--annotations", dest="annotations", help="file to load parsed user stories from and save them to, so that they are only parsed once over multiple runs", default=None)
+	g_p.add_argument("--memory-budget", dest="memory_budget", help="release the spaCy documents of each user story right after mining it, keeping only the token attributes that are used later, and print the peak memory use", action="store_true", default=False)
+	g_p.add_argument("--max-tokens", dest="max_tokens", help="do not parse user stories of more than MAX_TOKENS tokens, which fail with error code 5 (INT)", type=int, default=None)
+	g_p.add_argument("--time-budget", dest="time_budget", help="stop mining a user story after TIME_BUDGET seconds, which then fails with error code 6 (FLOAT)", type=float, default=None)
+	g_p.add_argument("--deadline", dest="deadline", help="skip the user stories that are left DEADLINE seconds after the start of the run, which fail with error code 7 (FLOAT)", type=float, default=None)
 	g_p.add_argument("--split", dest="split", help="Process the stories one by one", action="store_true", default=False)
+	g_p.add_argument("--no-report", dest="no_report", help="do not generate the HTML report", action="store_true", default=False)
+	g_p.add_argument("--report-limit", dest="report_limit", help="only show the details of the first REPORT_LIMIT user stories in the report (INT)", type=int, default=None)
+	g_p.add_argument("--near-duplicates", dest="near_duplicates", help="also flag user stories with a similarity of at least NEAR_DUPLICATES in the report (FLOAT, default = 0.8)", nargs='?', type=float, const=0.8, default=None)
+	g_p.add_argument("--progress", dest="progress", help="report the progress of each stage: a progress bar, JSON lines, or auto (a bar on a terminal, lines otherwise, the default)", nargs='?', choices=['auto', 'bar', 'lines'], const='auto', default=None)
+	g_p.add_argument("--progress-file", dest="progress_file", help="write the progress of each stage as JSON lines to PROGRESS_FILE", default=None)
+	g_p.add_argument("--progress-interval", dest="progress_interval", help="minimum number of seconds between two progress lines of a stage (FLOAT, default = 1.0)", type=float, default=1.0)
+	g_p.add_argument("--compress", dest="compress", help="compress the output files with gzip (.gz)", action="store_true", default=False)
 	s_p = p.add_argument_group("statistics arguments (optional)")
 	s_p.add_argument("-s", "--statistics", dest="statistics", help="show user story set statistics and output these to a .csv file", action="store_true", default=False)
 
 	w_p = p.add_argument_group("conceptual model generation tuning (optional)")
 	w_p.add_argument("-p", "--per_role", dest="per_role", help="create an additional conceptual model per role", action="store_true", default=False)
 	w_p.add_argument("-t", dest="threshold", help="set threshold for conceptual model generation (INT, default = 1.0)", type=float, default=1.0)
+	w_p.add_argument("--matrix-workers", dest="matrix_workers", help="number of processes to fill the factor matrix with, through shared memory (INT, default = 1)", type=int, default=1)
 	w_p.add_argument("-b", dest="base_weight", help="set the base weight (INT, default = 1)", type=int, default=1)	
 	w_p.add_argument("-wfr", dest="weight_func_role", help="weight of functional role (FLOAT, default = 1.0)", type=float, default=1)
 	w_p.add_argument("-wdo", dest="weight_main_obj", help="weight of main object (FLOAT, default = 1.0)", type=float, default=1)
@@ -293,22 +387,30 @@ This program has multiple functionalities:
 	else:
 		args = p.parse_args(args)
 
-	weights = [args.weight_func_role, args.weight_main_obj, args.weight_ff_means, args.weight_ff_ends, args.weight_compound]
-
 	if not args.system_name or args.system_name == '':
 		args.system_name = "System"
+	if args.memory_budget and args.save_corpus:
+		p.error("--save-corpus stores the spaCy documents, which --memory-budget releases")
+	if not args.model:
+		try:
+			args.model = get_pack(args.lang).default_model()
+		except ValueError as err:
+			p.error(str(err))
 	if not args.return_args:
-		spacy_nlp = initialize_nlp()
+		spacy_nlp = initialize_nlp(args.model, args.annotations)
+		result = None
 		if args.split:
 			stories = Reader.parse(args.filename)
 			for s in stories:
 				file = open('./tmp.txt', 'w+')
 				file.write(s)
 				file.close()
-				main(open('./tmp.txt', 'r'), args.system_name, args.print_us, args.print_ont, args.statistics, args.link, args.prolog, args.json, args.per_role, args.threshold, args.base_weight, weights, spacy_nlp)
-			return
+				main_args(open('./tmp.txt', 'r'), args, spacy_nlp)
 		else:
-			return main(args.filename, args.system_name, args.print_us, args.print_ont, args.statistics, args.link, args.prolog, args.json, args.per_role, args.threshold, args.base_weight, weights, spacy_nlp)
+			result = main_args(args.filename, args, spacy_nlp)
+		if args.annotations:
+			spacy_nlp.save(args.annotations)
+		return result
 	else:
 		return args
 
@@ -0,0 +1,138 @@
+''' Compares the compound noun and noun phrase extractors of the StoryMiner with the extractors they
+replaced, on fixed dependency parses
+'''
+
+import types
+import pytest
+
+pytest.importorskip("spacy")
+
+from vn.miner import MinerUtility
+from vn.utility import TokenList, get_attr, is_compound, is_sublist
+
+
+class Token(object):
+	"""Token of a fixed dependency parse, which compares like a spaCy token"""
+	def __init__(self, i, idx, text, pos, dep):
+		self.i = i
+		self.idx = idx
+		self.text = text
+		self.pos_ = pos
+		self.dep_ = dep
+		self.head = self
+		self.children = []
+
+	def __eq__(self, other):
+		return isinstance(other, Token) and self.idx == other.idx
+
+	def __hash__(self):
+		return hash(self.idx)
+
+	def __repr__(self):
+		return self.text
+
+
+class Doc(list):
+	"""Document of a fixed dependency parse"""
+	noun_chunks = []
+
+
+def parse(words, chunks=()):
+	"""
+	:param words: List of (text, POS, dependency, index of the head)
+	:param chunks: List of (start, end) of the noun chunks
+	:returns: User story with the parse as its data
+	"""
+	doc = Doc()
+	idx = 0
+	for i, (text, pos, dep, head) in enumerate(words):
+		doc.append(Token(i, idx, text, pos, dep))
+		idx += len(text) + 1
+	for token, (text, pos, dep, head) in zip(doc, words):
+		token.head = doc[head]
+		if head != token.i:
+			doc[head].children.append(token)
+	doc.noun_chunks = [doc[start:end] for start, end in chunks]
+	return types.SimpleNamespace(data=doc)
+
+# The extractors as they were before they were rewritten
+def old_get_compound_nouns(story, span):
+	compounds = []
+	nouns = MinerUtility.get_nouns(story, span)
+
+	for token in nouns:
+		for child in token.children:
+			if is_compound(child):
+				# Replace to take rightmost child
+				if child.idx < token.idx:
+					for compound in compounds:
+						if child in compound or token in compound:
+							compounds.remove(compound)
+				compounds.append([child, token])
+
+	if compounds and len(compounds) == 0 and type(compounds[0]) is list:
+		compounds = compounds[0]
+
+	return compounds
+
+def old_get_noun_phrases(story, span, part='data'):
+	phrases = []
+
+	for chunk in MinerUtility.noun_chunks(get_attr(story, part)):
+		chunk = MinerUtility.get_span(story, chunk)
+		if is_sublist(chunk, span):
+			phrases.append(chunk)
+
+	return phrases
+
+def texts(compounds):
+	return [[token.text for token in compound] for compound in compounds]
+
+
+PARSES = {
+	# "see the product owner"
+	'single': [('see', 'VERB', 'ROOT', 0), ('the', 'DET', 'det', 3), ('product', 'NOUN', 'compound', 3), ('owner', 'NOUN', 'dobj', 0)],
+	# "ticket system admin", a chain of compounds of which the rightmost is kept
+	'chain': [('ticket', 'NOUN', 'compound', 1), ('system', 'NOUN', 'compound', 2), ('admin', 'NOUN', 'ROOT', 2)],
+	# "user account data", two compounds of the same noun
+	'children': [('user', 'NOUN', 'compound', 2), ('account', 'NOUN', 'compound', 2), ('data', 'NOUN', 'ROOT', 2)],
+	# "new export format", an adjective that is not a noun
+	'amod': [('new', 'ADJ', 'amod', 2), ('export', 'NOUN', 'compound', 2), ('format', 'NOUN', 'ROOT', 2)],
+	# "view reports", no compounds
+	'none': [('view', 'VERB', 'ROOT', 0), ('reports', 'NOUN', 'dobj', 0)],
+}
+
+@pytest.mark.parametrize("name", sorted(PARSES))
+def test_compound_nouns_identical(name):
+	story = parse(PARSES[name])
+	span = TokenList(story.data)
+
+	assert texts(MinerUtility.get_compound_nouns(story, span)) == texts(old_get_compound_nouns(story, span))
+
+def test_compound_nouns_part_of_span():
+	story = parse(PARSES['chain'])
+	span = TokenList(story.data[1:])
+
+	assert texts(MinerUtility.get_compound_nouns(story, span)) == texts(old_get_compound_nouns(story, span)) == [['system', 'admin']]
+
+def test_compound_nouns_rightmost_replaces_all():
+	# "data export archive report": "data" has two compounds right of it, and is itself a compound
+	# left of "report", which replaces both of them. The old loop removed from the list it was
+	# iterating over, so it skipped the second one and kept it.
+	story = parse([('data', 'NOUN', 'compound', 3), ('export', 'ADJ', 'compound', 0), ('archive', 'ADJ', 'compound', 0), ('report', 'NOUN', 'ROOT', 3)])
+	span = TokenList(story.data)
+
+	assert texts(old_get_compound_nouns(story, span)) == [['archive', 'data'], ['data', 'report']]
+	assert texts(MinerUtility.get_compound_nouns(story, span)) == [['data', 'report']]
+
+@pytest.mark.parametrize("start,end", [(0, 6), (1, 6), (2, 6), (0, 3), (4, 5)])
+def test_noun_phrases_identical(start, end):
+	# "the product owner can export the monthly report"
+	words = [('the', 'DET', 'det', 2), ('product', 'NOUN', 'compound', 2), ('owner', 'NOUN', 'nsubj', 4), ('can', 'VERB', 'aux', 4),
+			 ('export', 'VERB', 'ROOT', 4), ('the', 'DET', 'det', 7), ('monthly', 'ADJ', 'amod', 7), ('report', 'NOUN', 'dobj', 4)]
+	story = parse(words, chunks=[(0, 3), (5, 8)])
+	span = TokenList(story.data[start:end + 2])
+
+	new = [[token.text for token in phrase] for phrase in MinerUtility.get_noun_phrases(story, span)]
+	old = [[token.text for token in phrase] for phrase in old_get_noun_phrases(story, span)]
+	assert new == old
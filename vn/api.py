@@ -0,0 +1,137 @@
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from lang.packs import DEFAULT_LANGUAGE
+from vn.io import Exporter
+from vn.miner import StoryMiner, parse
+from vn.nlp import LockedBackend
+from vn.matrix import Matrix
+from vn.memory import release_docs
+from vn.pattern import Constructor
+from vn.statistics import Counter, Summary
+from vn.utility import Vocabulary
+
+
+class Pipeline:
+	"""Runs Visual Narrator as a library, e.g. inside an asyncio web service
+
+	The user stories are mined in an executor, so that the Natural Language Processor does not
+	block the event loop, and the artifacts are returned instead of written to files:
+
+		pipeline = Pipeline(nlp, "TicketSystem")
+		async for story in pipeline.mine(stories):
+			...
+		result = await pipeline.run(stories)
+	"""
+	def __init__(self, nlp, systemname="System", threshold=1.0, base=1, weights=(1, 1, 0.7, 0.5, 0.66), link=False, per_role=False, concurrency=4, executor=None, single_parse=False, lang=DEFAULT_LANGUAGE, matrix_workers=1, memory_budget=False, max_tokens=None, time_budget=None):
+		"""
+		:param nlp: Natural Language Processor (spaCy, or a vn.nlp.Backend), which is called by one thread at a time
+		:param systemname: Name of the system, as used in the ontology
+		:param threshold: Threshold for conceptual model generation
+		:param base: Base weight
+		:param weights: Weights of the functional role, main object, free form means, free form ends and compound nouns
+		:param link: Link ontology classes to the user stories they originate from
+		:param per_role: Also create an ontology per role
+		:param concurrency: Maximum number of user stories being mined at the same time
+		:param executor: Executor to mine in (default: a thread pool of size concurrency)
+		:param single_parse: Parse each user story once (see StoryMiner)
+		:param lang: Language of the user stories, which is a language pack in lang/
+		:param matrix_workers: Number of processes to fill the factor matrix with (see vn.shared)
+		:param memory_budget: Release the spaCy documents of each user story once it is mined (see vn.memory)
+		:param max_tokens: Maximum number of tokens of a user story (see StoryMiner)
+		:param time_budget: Maximum number of seconds to mine a user story in (see StoryMiner)
+		"""
+		self.nlp = LockedBackend(nlp)
+		self.systemname = systemname
+		self.threshold = threshold
+		self.base = base
+		self.weights = weights
+		self.link = link
+		self.per_role = per_role
+		self.concurrency = concurrency
+		self.executor = executor if executor else ThreadPoolExecutor(max_workers=concurrency)
+		self.miner = StoryMiner(single_parse, lang, max_tokens, time_budget)
+		self.matrix_workers = matrix_workers
+		self.memory_budget = memory_budget
+		self.counter = Counter()
+
+	async def mine(self, stories, failed=None, summary=None):
+		"""Mines user stories as they arrive
+
+		:param stories: Async iterator of user story texts
+		:param failed: List to append [id, text, error arguments] to for every user story that could not be mined
+		:param summary: Summary to add the (failed) user stories to
+		:returns: Async generator of mined user stories, in input order
+		"""
+		loop = asyncio.get_event_loop()
+		pending = deque()
+		us_id = 1
+
+		async for text in stories:
+			if not text or text.isspace():
+				continue
+			pending.append((us_id, text, loop.run_in_executor(self.executor, self.mine_story, text, us_id)))
+			us_id += 1
+
+			if len(pending) >= self.concurrency:
+				story = await self.collect(pending.popleft(), failed, summary)
+				if story:
+					yield story
+
+		while pending:
+			story = await self.collect(pending.popleft(), failed, summary)
+			if story:
+				yield story
+
+	async def collect(self, item, failed, summary):
+		us_id, text, future = item
+		try:
+			story = await future
+		except ValueError as err:
+			if failed is not None:
+				failed.append([us_id, text, err.args])
+			if summary is not None:
+				summary.add_failure(err)
+			return None
+		if summary is not None:
+			summary.add(story)
+		return story
+
+	def mine_story(self, text, us_id):
+		story = parse(text, us_id, self.systemname, self.nlp, self.miner)
+		story = self.counter.count(story)
+		if self.memory_budget:
+			release_docs(story)
+		return story
+
+	async def run(self, stories):
+		"""Mines user stories as they arrive and generates the ontology once all have been mined
+
+		:param stories: Async iterator of user story texts
+		:returns: Dictionary of the mined user stories, failed user stories, summary statistics and the generated artifacts
+		"""
+		failed = []
+		summary = Summary()
+		us_instances = [story async for story in self.mine(stories, failed, summary)]
+
+		result = await asyncio.get_event_loop().run_in_executor(self.executor, self.generate, us_instances)
+		result.update({'failed_stories': failed, 'summary': summary})
+		return result
+
+	def generate(self, us_instances):
+		"""Generates the factor matrix, ontology and Prolog of mined user stories
+
+		:param us_instances: List of mined user stories
+		:returns: Dictionary of the user stories and artifacts
+		"""
+		vocabulary = Vocabulary()
+		matrix = Matrix(self.base, self.weights, self.matrix_workers)
+		m, count_matrix, stories_list, rme = matrix.generate(us_instances, ' '.join([u.sentence for u in us_instances]), self.nlp, vocabulary)
+
+		patterns = Constructor(self.nlp, us_instances, m, vocabulary=vocabulary)
+		ontology, prolog, ontobj, prologobj, per_role = patterns.make(self.systemname, self.threshold, self.link, self.per_role)
+
+		return {'us_instances': us_instances, 'output_ontobj': ontobj, 'output_prologobj': prologobj, 'matrix': matrix.named(m, vocabulary),
+				'ontology': ontology, 'prolog': prolog, 'per_role': per_role,
+				'json': ''.join(Exporter.jsonl(us_instances))}
@@ -0,0 +1,146 @@
+import json
+import mmap
+import struct
+from spacy.tokens import Doc, Span
+from spacy.tokens.token import Token
+
+from vn.userstory import UserStory
+from vn.utility import TokenList
+
+MAGIC = b"VNC1"
+FOOTER = struct.Struct("<4sQQ")
+
+class Corpus:
+	"""Mined user stories stored in a single file, which can be read back without running the
+	Natural Language Processor again
+
+	The file contains the serialized spaCy documents and a JSON record per user story, in which
+	tokens are stored as (document, token index). It ends with an index of the user story records,
+	so that the file can be memory-mapped and only the user stories that are accessed get loaded.
+	"""
+	def __init__(self, filename, nlp):
+		self.vocab = nlp.vocab
+		self.file = open(filename, 'rb')
+		self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+		self.cache = {}
+
+		magic, index_offset, index_length = FOOTER.unpack(self.data[-FOOTER.size:])
+		if magic != MAGIC:
+			raise ValueError("Not a Visual Narrator corpus: " + str(filename))
+		self.index = json.loads(self.data[index_offset:index_offset + index_length].decode('utf-8'))
+
+	def __len__(self):
+		return len(self.index)
+
+	def __getitem__(self, i):
+		if isinstance(i, slice):
+			return [self[j] for j in range(*i.indices(len(self)))]
+		if i < 0:
+			i += len(self)
+		if i not in self.cache:
+			self.cache[i] = self.load(i)
+		return self.cache[i]
+
+	def __iter__(self):
+		for i in range(len(self)):
+			yield self[i]
+
+	def close(self):
+		self.cache = {}
+		self.data.close()
+		self.file.close()
+
+	def read(self, offset, length):
+		return self.data[offset:offset + length]
+
+	def load(self, i):
+		"""Loads a user story and its documents
+
+		:param i: Position of the user story in the corpus
+		:returns: User story
+		"""
+		record = json.loads(self.read(*self.index[i]).decode('utf-8'))
+		docs = {name: Doc(self.vocab).from_bytes(self.read(*loc)) for name, loc in record["docs"].items()}
+		story = UserStory(record["number"], record["text"], record["sentence"])
+		Corpus.fill(story, record["story"], docs)
+
+		return story
+
+	def fill(obj, encoded, docs):
+		for attr, value in encoded.items():
+			if isinstance(value, dict) and "o" in value and hasattr(obj, attr):
+				Corpus.fill(getattr(obj, attr), value["o"], docs)
+			else:
+				setattr(obj, attr, Corpus.decode(value, docs))
+
+	def decode(value, docs):
+		if isinstance(value, list):
+			return [Corpus.decode(v, docs) for v in value]
+		elif isinstance(value, dict):
+			if "t" in value:
+				return docs[value["t"][0]][value["t"][1]]
+			elif "s" in value:
+				return docs[value["s"][0]][value["s"][1]:value["s"][2]]
+			elif "d" in value:
+				return docs[value["d"]]
+			elif "l" in value:
+				return TokenList(Corpus.decode(v, docs) for v in value["l"])
+		return value
+
+	def dump(stories):
+		"""Serializes mined user stories, one at a time
+
+		:param stories: List of user stories
+		:returns: Generator of bytes, to be written to a single file
+		"""
+		offset = 0
+		index = []
+
+		for story in stories:
+			docs = {}
+			record = {"number": story.number, "text": story.text, "sentence": story.sentence, "docs": {}}
+			record["story"] = Corpus.encode(vars(story), docs)["o"]
+
+			for name, doc in docs.values():
+				data = doc.to_bytes()
+				record["docs"][name] = [offset, len(data)]
+				offset += len(data)
+				yield data
+
+			data = json.dumps(record).encode('utf-8')
+			index.append([offset, len(data)])
+			offset += len(data)
+			yield data
+
+		data = json.dumps(index).encode('utf-8')
+		yield data
+		yield FOOTER.pack(MAGIC, offset, len(data))
+
+	def encode(value, docs):
+		"""Encodes (attributes of) a user story, where tokens, spans and documents refer to the
+		documents in docs by name
+
+		:param value: Value to encode
+		:param docs: Dictionary of id(document) to (name, document), which is filled while encoding
+		:returns: JSON serializable value
+		"""
+		if type(value) is Token:
+			return {"t": [Corpus.doc_name(value.doc, docs), value.i]}
+		elif type(value) is Span:
+			return {"s": [Corpus.doc_name(value.doc, docs), value.start, value.end]}
+		elif type(value) is Doc:
+			return {"d": Corpus.doc_name(value, docs)}
+		elif type(value) is TokenList:
+			return {"l": [Corpus.encode(v, docs) for v in value]}
+		elif isinstance(value, (list, tuple)):
+			return [Corpus.encode(v, docs) for v in value]
+		elif isinstance(value, dict):
+			return {"o": {k: Corpus.encode(v, docs) for k, v in value.items()}}
+		elif hasattr(value, '__dict__'):
+			return Corpus.encode(vars(value), docs)
+		return value
+
+	def doc_name(doc, docs):
+		if id(doc) not in docs:
+			docs[id(doc)] = ["doc" + str(len(docs)), doc]
+		return docs[id(doc)][0]
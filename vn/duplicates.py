@@ -0,0 +1,89 @@
+import zlib
+import numpy as np
+
+PRIME = (1 << 32) + 15
+
+class Duplicates:
+	def exact(texts):
+		"""Groups texts that are the same after normalization
+
+		:param texts: List of [user story ID, normalized text]
+		:returns: List of groups (of at least two user story IDs), in order of first occurrence
+		"""
+		groups = {}
+		for us_id, text in texts:
+			groups.setdefault(text, []).append(us_id)
+		return [ids for ids in groups.values() if len(ids) > 1]
+
+
+class MinHash:
+	"""Finds near-duplicate texts, estimating their Jaccard similarity on word shingles with MinHash
+	signatures, where only texts that share a band of their signature (LSH) are compared
+	"""
+	def __init__(self, threshold=0.8, num_perm=64, bands=16, shingle=3, seed=1):
+		"""
+		:param threshold: Minimum Jaccard similarity of near-duplicates
+		:param num_perm: Number of hash functions in a signature
+		:param bands: Number of bands the signature is divided in, which determines how similar texts must be to be compared
+		:param shingle: Number of words in a shingle
+		:param seed: Seed of the hash functions
+		"""
+		self.threshold = threshold
+		self.bands = bands
+		self.rows = num_perm // bands
+		self.shingle = shingle
+		rng = np.random.RandomState(seed)
+		self.a = rng.randint(1, 1 << 32, size=self.bands * self.rows).astype(np.uint64)
+		self.b = rng.randint(0, 1 << 32, size=self.bands * self.rows).astype(np.uint64)
+
+	def shingles(self, text):
+		words = str.lower(text).split()
+		if len(words) <= self.shingle:
+			return set([' '.join(words)])
+		return set([' '.join(words[i:i + self.shingle]) for i in range(len(words) - self.shingle + 1)])
+
+	def signature(self, shingles):
+		hashes = np.array([zlib.crc32(s.encode('utf-8')) for s in shingles], dtype=np.uint64)
+		return ((np.outer(hashes, self.a) + self.b) % np.uint64(PRIME)).min(axis=0)
+
+	def groups(self, texts):
+		"""Groups near-duplicate texts
+
+		:param texts: List of [user story ID, normalized text], without exact duplicates
+		:returns: List of [lowest similarity, user story IDs] per group, in order of first occurrence
+		"""
+		shingles = [self.shingles(text) for us_id, text in texts]
+		signatures = [self.signature(s) for s in shingles]
+
+		candidates = set()
+		for band in range(self.bands):
+			buckets = {}
+			for i, signature in enumerate(signatures):
+				key = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+				buckets.setdefault(key, []).append(i)
+			for bucket in buckets.values():
+				for j in range(1, len(bucket)):
+					for i in bucket[:j]:
+						candidates.add((i, bucket[j]))
+
+		parent = list(range(len(texts)))
+		similarity = {}
+
+		def find(i):
+			while parent[i] != i:
+				parent[i] = parent[parent[i]]
+				i = parent[i]
+			return i
+
+		for i, j in sorted(candidates):
+			jaccard = len(shingles[i] & shingles[j]) / len(shingles[i] | shingles[j])
+			if jaccard >= self.threshold:
+				ri, rj = find(i), find(j)
+				root = min(ri, rj)
+				parent[max(ri, rj)] = root
+				similarity[root] = min(jaccard, similarity.get(ri, 1.0), similarity.get(rj, 1.0))
+
+		groups = {}
+		for i in range(len(texts)):
+			groups.setdefault(find(i), []).append(texts[i][0])
+		return [[similarity[root], ids] for root, ids in groups.items() if len(ids) > 1]
@@ -1,4 +1,5 @@
 from lang.owlprefix import PREFIX_DICT
+from vn.utility import Vocabulary
 
 class Generator:
 	def __init__(self, classes, relationships, onto=True, is_long=None):
@@ -11,9 +12,6 @@ class Generator:
 		for c in self.classes:
 			c.stories.sort()
 
-		if not self.onto:
-			return self.gen_prolog_from_onto()
-
 		if self.long is None:
 			li = self.gen_ontology(onto)
 		else:
@@ -72,47 +70,61 @@ class Generator:
 
 		return new_rels
 
-	def gen_prolog_from_onto(self):
-		prologtext = []
-		concept = ""
 
-		for c in self.classes:
-			concept = self.get_concept(c.name)
-			prologtext.append(concept)
-			for s in c.stories:
-				if self.get_found(concept, s):
-					prologtext.append(self.get_found(concept, s))
-
-		for r in self.relationships:
-			d_concept = self.get_concept(r.domain)
-			r_concept = self.get_concept(r.range)
-			rel = ""
-			linkrel = ['role', 'means', 'ends']
-			diffrel = linkrel + ['isa']
-
-			if str.lower(r.name) in diffrel:
-				if str.lower(r.name) in linkrel:
-					prologtext.append(str.lower(r.name) + "(" + d_concept + ",'" + r.range + "')")				
-				else:
-					prologtext.append(str.lower(r.name) + "(" + d_concept + "," + r_concept + ")")
-			else:
-				rel = "rel(" + d_concept + ",'" + r.name + "'," + r_concept + ")"
-				prologtext.append(rel)
-				for s in r.stories:
-					if self.get_found(rel, s):
-						prologtext.append(self.get_found(rel, s))
+class Prolog:
+	def __init__(self):
+		self.facts = set()
+		self.concepts = {}
+		self.relationships = []
+		self.relationship_index = {}
+
+	def prt(self):
+		return '.\n'.join(sorted(self.facts))
+
+	def get_class_by_name(self, story, name, parent='', is_role=False):
+		if name.isspace() or name == '':
+			return False
+
+		if str.lower(name) not in self.concepts:
+			self.concepts[str.lower(name)] = self.get_concept(name)
+			self.facts.add(self.concepts[str.lower(name)])
+
+		concept = self.concepts[str.lower(name)]
+		if story >= 0:
+			self.facts.add(self.get_found(concept, story))
 
-		prologtext.sort()
+		return concept
 
-		return '.\n'.join(prologtext)
+	def new_relationship(self, story, pre, rel, post):
+		if (pre, rel, post) in self.relationship_index:
+			r = self.relationship_index[(pre, rel, post)]
+		else:
+			r = OntProperty(None, "Object", rel, pre, post)
+			self.relationships.append(r)
+			self.relationship_index[(pre, rel, post)] = r
+			self.facts.add(self.get_fact(r))
+		r.stories.append(story)
+
+		if story >= 0 and str.lower(rel) not in ['role', 'means', 'ends', 'isa']:
+			self.facts.add(self.get_found(self.get_fact(r), story))
+
+		return r
+
+	def get_fact(self, r):
+		d_concept = self.get_concept(r.domain)
+		r_concept = self.get_concept(r.range)
+
+		if str.lower(r.name) in ['role', 'means', 'ends']:
+			return str.lower(r.name) + "(" + d_concept + ",'" + r.range + "')"
+		elif str.lower(r.name) == 'isa':
+			return str.lower(r.name) + "(" + d_concept + "," + r_concept + ")"
+		return "rel(" + d_concept + ",'" + r.name + "'," + r_concept + ")"
 
 	def get_concept(self, text):
 		return "concept('" + str(text) + "')"
 
 	def get_found(self, text, story):
-		if story >= 0:
-			return "found(" + text + ",'US" + str(story) + "')"
-		return False
+		return "found(" + text + ",'US" + str(story) + "')"
 
 
 class GenHelp:
@@ -143,15 +155,23 @@ class GenHelp:
 		return "# " + com + "\n"
 
 class Ontology:
-	def __init__(self, sysname, stories, option=None):
+	def __init__(self, sysname, stories, option=None, vocabulary=None):
+		"""
+		:param sysname: Name of the system
+		:param stories: List of user stories
+		:param vocabulary: Vocabulary to compare the names of classes with
+		"""
 		self.sys_name = sysname
 		self.ontology = "http://fakesite.org/" + "_".join(str(sysname).lower().split()) + ".owl#"
 		self.ontology_name = "onto"
 		self.option = option
 		self.gh = GenHelp(self.ontology, option)
 		self.stories = stories
+		self.vocabulary = vocabulary if vocabulary is not None else Vocabulary()
 		self.classes = []
+		self.class_index = {}
 		self.relationships = []
+		self.relationship_index = {}
 
 	def gen_head(self, parts):
 		return Header(self, parts)
@@ -172,21 +192,17 @@ class Ontology:
 
 		c_stories = []
 
-		if self.classes:
-			for c in self.classes:
-				if str.lower(name) == str.lower(c.name) and (str.lower(parent) == str.lower(c.parent) or (self.is_empty(parent) and self.is_empty(c.parent))):
-					if is_role:
-						c.is_role = True
-					c.stories.append(story)
-					return c
-				if str.lower(name) == str.lower(c.name) and not self.is_empty(c.parent) and self.is_empty(parent):
-					if is_role:
-						c.is_role = True
-					c.stories.append(story)
-					return c
-				if str.lower(name) == str.lower(c.name) and not self.is_empty(parent):
-					c_stories = c.stories
-					self.classes.remove(c)
+		# There is at most one class per name (regardless of capitalization), which is kept if it has
+		# the same parent or no parent is given, and is replaced by a class with the new parent otherwise
+		c = self.class_index.get(self.vocabulary.get_key(name))
+		if c:
+			if self.is_empty(parent) or self.vocabulary.get_key(parent) == c.parent_key:
+				if is_role:
+					c.is_role = True
+				c.stories.append(story)
+				return c
+			c_stories = c.stories
+			self.classes.remove(c)
 
 		new_class = self.make_class(name, parent)
 		if is_role:
@@ -194,6 +210,7 @@ class Ontology:
 		new_class.stories = c_stories
 		new_class.stories.append(story)
 		self.classes.append(new_class)
+		self.class_index[new_class.key] = new_class
 
 		if not self.is_empty(parent):
 			parent_class = self.get_class_by_name(-1, parent, '')
@@ -206,15 +223,15 @@ class Ontology:
 		return False
 
 	def new_relationship(self, story, pre, rel, post):
-		if self.relationships:
-			for r in self.relationships:
-				if r.domain == pre and r.name == rel and r.range == post:
-					r.stories.append(story)
-					return r
+		if (pre, rel, post) in self.relationship_index:
+			r = self.relationship_index[(pre, rel, post)]
+			r.stories.append(story)
+			return r
 
 		new_rel = self.make_relationship(rel, pre, post)
 		new_rel.stories.append(story)
 		self.relationships.append(new_rel)
+		self.relationship_index[(pre, rel, post)] = new_rel
 		return new_rel
 
 
@@ -223,6 +240,9 @@ class OntClass(object):
 		self.ontobj = ontology
 		self.name = name
 		self.parent = parent
+		self.key = ontology.vocabulary.key(name)
+		# Classes without a parent have no key for it
+		self.parent_key = None if ontology.is_empty(parent) else ontology.vocabulary.key(parent)
 		self.prefix = prefix
 		self.stories = []
 		self.is_role = False
@@ -1,6 +1,13 @@
+import os
 import os.path
 import csv
+import gzip
+import json
+import numpy as np
 import pandas
+from concurrent.futures import ThreadPoolExecutor
+
+from vn.utility import t
 
 class Reader:
 	def parse(open_file):
@@ -17,11 +24,16 @@ class Reader:
 			return lines
 
 class Writer:
-	def __init__(self):
-		self.number = 1
+	def __init__(self, compress=False, workers=4):
+		self.number = None
+		self.compress = compress
+		self.dirs = set()
+		self.pending = []
+		self.executor = ThreadPoolExecutor(max_workers=workers)
 
 	def make_file(self, dirname, filename, filetype, content):
-		"""Makes a file and writes to it
+		"""Makes a file and writes to it in the background. The run number is reserved
+		with the first file, and used for all other files of the run
 
 		:param dirname: Name of the target directory
 		:param filename: File name (without extension)
@@ -29,35 +41,117 @@ class Writer:
 		:param content: Content to write to file
 		:returns: Name and location of the file
 		"""
-		if not os.path.exists(dirname):
-	    		os.makedirs(dirname)
-	
-		outputname = ""
+		self.make_dir(dirname)
+
 		filetype = "." + str(filetype)
+		if self.compress and filetype not in [".npz", ".vnc"]:
+			filetype += ".gz"
 		potential_outp = dirname + "/" + filename
 
-		if self.number == 1:			
-			while os.path.exists(potential_outp + str(self.number) + filetype):
-					self.number += 1
+		if self.number is None:
+			self.number = self.reserve(dirname, filename, filetype)
 		outputname = potential_outp + str(self.number) + filetype
 
+		self.pending.append(self.executor.submit(self.write_file, outputname, filetype, content))
+
+		return outputname
+
+	def make_dir(self, dirname):
+		if dirname not in self.dirs:
+			os.makedirs(dirname, exist_ok=True)
+			self.dirs.add(dirname)
+
+	def reserve(self, dirname, filename, filetype):
+		"""Reserves the lowest free run number by creating an empty file, so that concurrent runs
+		do not write to the same files
+
+		:param dirname: Name of the target directory
+		:param filename: File name (without extension and number)
+		:param filetype: Extension of the file
+		:returns: Run number
+		"""
+		existing = set(os.listdir(dirname))
+		number = 1
+
+		while True:
+			while filename + str(number) + filetype in existing:
+				number += 1
+			try:
+				os.close(os.open(dirname + "/" + filename + str(number) + filetype, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+				return number
+			except FileExistsError:
+				number += 1
+
+	def close(self):
+		"""Waits until all files are written
 
-		if filetype == ".csv":			
-			self.writecsv(outputname, content)
+		:returns: Names and locations of the written files
+		"""
+		try:
+			return [f.result() for f in self.pending]
+		finally:
+			self.pending = []
+			self.executor.shutdown()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		if exc_type is None:
+			self.close()
 		else:
-			self.write(outputname, content)			
+			# The error of the run is raised, rather than that of a file
+			self.pending = []
+			self.executor.shutdown()
+
+	def write_file(self, outputname, filetype, content):
+		"""Writes content to a temporary file, which replaces the output file once completely written
+
+		:param outputname: Name and location of the output file
+		:param filetype: Type of file
+		:param content: Content to write to file
+		:returns: Name and location of the output file
+		"""
+		tmpname = outputname + "." + str(os.getpid()) + ".tmp"
+
+		try:
+			if filetype.startswith(".csv"):
+				self.writecsv(tmpname, content)
+			elif filetype == ".npz":
+				self.writenpz(tmpname, content)
+			elif filetype == ".vnc":
+				self.writebinary(tmpname, content)
+			else:
+				self.write(tmpname, content)
+			os.replace(tmpname, outputname)
+		except Exception:
+			try:
+				os.remove(tmpname)
+			except OSError:
+				# The temporary file was not created, the original error is raised
+				pass
+			raise
 
 		return outputname
 
+	def open_file(self, outputname):
+		if self.compress:
+			return gzip.open(outputname, 'wt')
+		return open(outputname, 'w')
+
 	def write(self, outputname, text):
 		"""Writes text to a file
 
 		:param outputname: Name and location of the output file
-		:param text: Text to write to the file
+		:param text: Text, lines of text or a dictionary (written as JSON) to write to the file
 		"""
-		with open(outputname, 'w') as f:
-			f.write(text)
-			f.close()
+		with self.open_file(outputname) as f:
+			if isinstance(text, str):
+				f.write(text)
+			elif isinstance(text, dict):
+				json.dump(text, f, indent=1)
+			else:
+				f.writelines(text)
 
 	def writecsv(self, outputname, li):
 		"""Writes a list/array/Pandas DataFrame to a CSV file
@@ -65,9 +159,83 @@ class Writer:
 		:param outputname: Name and location of the output file
 		:param li: List/array/DataFrame
 		"""
-		with open(outputname, 'wt') as f:
+		with self.open_file(outputname) as f:
 			if isinstance(li, pandas.core.frame.DataFrame):
 				li.to_csv(path_or_buf=f, sep=",", quotechar='"', quoting=csv.QUOTE_NONNUMERIC)
 			else:
 				writer = csv.writer(f, delimiter=",", quotechar='"', quoting=csv.QUOTE_NONNUMERIC)
 				writer.writerows(li)
+
+	def writebinary(self, outputname, chunks):
+		"""Writes bytes to a file
+
+		:param outputname: Name and location of the output file
+		:param chunks: Bytes, or chunks of bytes, to write to the file
+		"""
+		with open(outputname, 'wb') as f:
+			if isinstance(chunks, bytes):
+				f.write(chunks)
+			else:
+				f.writelines(chunks)
+
+	def writenpz(self, outputname, columns):
+		"""Writes a dictionary of NumPy arrays to a compressed NumPy (.npz) file
+
+		:param outputname: Name and location of the output file
+		:param columns: Dictionary of column names and arrays
+		"""
+		with open(outputname, 'wb') as f:
+			np.savez_compressed(f, **columns)
+
+class Exporter:
+	def jsonl(stories):
+		"""Converts mined user stories to JSON lines, one user story at a time
+
+		:param stories: List of user stories
+		:returns: Generator of JSON lines
+		"""
+		for story in stories:
+			yield json.dumps(story.toJSON()) + "\n"
+
+	def columns(stories):
+		"""Converts mined user stories to columns, where the tokens of each user story are stored
+		as a flat column with offsets pointing to the first token of each user story
+
+		:param stories: List of user stories
+		:returns: Dictionary of column names and NumPy arrays
+		"""
+		columns = {"number": [], "text": [], "has_ends": [], "role_indicator": [], "means_indicator": [], "ends_indicator": [],
+				   "functional_role": [], "main_verb": [], "main_verb_type": [], "main_object": [], "ends_main_verb": [], "ends_main_object": []}
+		tokens = {"means_free_form": [], "means_nouns": [], "ends_free_form": [], "ends_nouns": []}
+		offsets = {name: [0] for name in tokens}
+
+		for story in stories:
+			columns["number"].append(story.number)
+			columns["text"].append(story.text)
+			columns["has_ends"].append(story.has_ends)
+			columns["role_indicator"].append(story.role.indicator)
+			columns["means_indicator"].append(story.means.indicator)
+			columns["ends_indicator"].append(story.ends.indicator)
+			columns["functional_role"].append(t(story.role.functional_role.main))
+			columns["main_verb"].append(t(story.means.main_verb.main))
+			columns["main_verb_type"].append(story.means.main_verb.type)
+			columns["main_object"].append(t(story.means.main_object.main))
+			columns["ends_main_verb"].append(t(story.ends.main_verb.main) if story.has_ends else "")
+			columns["ends_main_object"].append(t(story.ends.main_object.main) if story.has_ends else "")
+
+			for name in tokens:
+				part, attr = name.split("_", 1)
+				li = getattr(getattr(story, part), attr)
+				tokens[name].extend(li)
+				offsets[name].append(offsets[name][-1] + len(li))
+
+		arrays = {name: np.array(values, dtype=str) for name, values in columns.items()}
+		arrays["number"] = np.array(columns["number"], dtype=np.int64)
+		arrays["has_ends"] = np.array(columns["has_ends"], dtype=bool)
+
+		for name, li in tokens.items():
+			arrays[name + "_i"] = np.array([token.i for token in li], dtype=np.int32)
+			arrays[name + "_text"] = np.array([token.text for token in li], dtype=str)
+			arrays[name + "_offsets"] = np.array(offsets[name], dtype=np.int64)
+
+		return arrays
@@ -1,18 +1,40 @@
 import numpy as np
 import pandas as pd
 from spacy import attrs
+from vn.progress import Progress
+from vn.shared import SharedCorpus, ROLE, MEANS, ENDS, DATA, VERB, FR_MAIN, FR_COMPOUND, MO_MAIN, MO_COMPOUND, MEANS_NOUN, EO_MAIN, EO_COMPOUND, EO_PHRASE, ENDS_NOUN, key
 from vn.utility import *
 
 
 class Matrix:
-	def __init__(self, base, weight):
+	def __init__(self, base, weight, workers=1, progress=None):
+		"""
+		:param base: Base weight
+		:param weight: Weights of the functional role, main object, free form means, free form ends and compound nouns
+		:param workers: Number of processes to fill the matrices with (see vn.shared)
+		:param progress: Progress to report the user stories done to (see vn.progress)
+		"""
+		self.workers = workers
+		self.progress = progress if progress else Progress()
 		self.VAL_FUNC_ROLE = base * weight[0]
 		self.VAL_MAIN_OBJ = base * weight[1]
 		self.VAL_MEANS_NOUN = base * weight[2]
 		self.VAL_ENDS_NOUN = base * weight[3]
 		self.VAL_COMPOUND = weight[4]
 
-	def generate(self, stories, all_words, nlp):
+	def generate(self, stories, all_words, nlp, vocabulary=None):
+		"""
+		:param stories: List of mined user stories
+		:param all_words: Text of the sentences of the user stories
+		:param nlp: Natural Language Processor (spaCy)
+		:param vocabulary: Vocabulary that is shared with the ontology, of which the ids of the cases index the matrices (see named), or None to index them by the cases themselves
+		:returns: Factor matrix, count matrix, list of the user stories per case, and the role, means and ends matrix
+		"""
+		# Without a shared vocabulary, the ids would mean nothing to the caller
+		by_case = vocabulary is None
+		if by_case:
+			vocabulary = Vocabulary()
+
 		all_words = ' '.join(all_words.split())
 		tokens = nlp(all_words)
 
@@ -28,16 +50,7 @@ class Matrix:
 
 		#doc_array = self.replace_ids(doc_array, words)
 
-		w_us = pd.DataFrame(0.0, index=words, columns=ids)
-		w_us = w_us.iloc[np.unique(w_us.index, return_index=True)[1]]
-
-		w_us = self.get_factor(w_us, stories)
-
-		w_us['sum'] = w_us.sum(axis=1)
-
-		# w_us = self.remove_stop_words(w_us, doc_array)
-		w_us = self.remove_indicators(w_us, stories, nlp)
-		w_us = self.remove_verbs(w_us, stories)
+		rows = np.array([vocabulary.add(case) for case in np.unique(words)], dtype=np.int64)
 
 		###
 		us_ids = []
@@ -53,117 +66,128 @@ class Matrix:
 			if us.ends.indicator:
 				us_ids.append(us.txtnr())
 				rme.append('Ends')
-
-		rme_cols = pd.MultiIndex.from_arrays([us_ids, rme], names=['user_story', 'part'])
-		rme_us = pd.DataFrame(0, index=words, columns=rme_cols)
-		rme_us = rme_us.iloc[np.unique(rme_us.index, return_index=True)[1]]
-		rme_us = self.get_role_means_ends(rme_us, stories)	
 		###
 
-		colnames = ['Functional Role', 'Functional Role Compound', 'Main Object', 'Main Object Compound', 'Means Free Form Noun', 'Ends Free Form Noun']
-		stories_list = [[l, []] for l in list(w_us.index.values)]
-		count_matrix = pd.DataFrame(0, index=w_us.index, columns=colnames)
-		count_matrix, stories_list = self.count_occurence(count_matrix, stories_list, stories)
-
-		return w_us, count_matrix, stories_list, rme_us
-		
-	def get_factor(self, matrix, stories):
-		for story in stories:
-			if story.has_ends:
-				parts = ['role', 'means', 'ends']
-			else:
-				parts = ['role', 'means']
+		records, marks = self.records(stories, vocabulary)
+		corpus = SharedCorpus(records, marks, len(stories), len(rme))
+		try:
+			values = [self.VAL_FUNC_ROLE, self.VAL_MAIN_OBJ, self.VAL_MEANS_NOUN, self.VAL_ENDS_NOUN, self.VAL_COMPOUND]
+			factor, rme_us, counts = corpus.fill(len(vocabulary), values, self.workers)
+			factor = factor[rows]
 
-			for part in parts:
-				matrix = self.get_factor_part(matrix, story, part)		
+			w_us = pd.DataFrame(factor, index=rows, columns=ids)
+			w_us['sum'] = factor.sum(axis=1)
 
-		return matrix
+			# w_us = self.remove_stop_words(w_us, doc_array)
+			w_us = self.remove_indicators(w_us, stories, nlp, vocabulary)
+			w_us = self.remove_verbs(w_us, corpus, vocabulary)
+		finally:
+			corpus.close()
 
-	def get_factor_part(self, matrix, story, part):
-		for token in eval('story.' + str(part) + '.text'):
-			if get_case(token) in matrix.index.values:
-				matrix = self.add(matrix, get_case(token), story.txtnr(), eval('self.score_' + str(part) + '(token, story)'))
+		rme_cols = pd.MultiIndex.from_arrays([us_ids, rme], names=['user_story', 'part'])
+		rme_us = pd.DataFrame(rme_us[rows], index=rows, columns=rme_cols)
 
-		return matrix
+		colnames = ['Functional Role', 'Functional Role Compound', 'Main Object', 'Main Object Compound', 'Means Free Form Noun', 'Ends Free Form Noun']
+		count_matrix = pd.DataFrame(counts[w_us.index.values], index=w_us.index, columns=colnames)
+		stories_list = self.get_stories_list(w_us.index.values, stories, vocabulary)
 
-	def score_role(self, token, story):
-		weight = 0
+		if by_case:
+			w_us, count_matrix, rme_us = [self.named(matrix, vocabulary) for matrix in [w_us, count_matrix, rme_us]]
 
-		if self.is_phrasal('role.functional_role', token, story) == 1:
-			weight += self.VAL_FUNC_ROLE
-		elif self.is_phrasal('role.functional_role', token, story) == 2:
-			weight += self.VAL_FUNC_ROLE * self.VAL_COMPOUND
+		return w_us, count_matrix, stories_list, rme_us
 
-		return weight
+	def records(self, stories, vocabulary):
+		"""Converts the tokens of the user stories to records (see vn.shared.TOKEN), and marks the
+		tokens that the miner found (see marks), from which the workers score the tokens
+
+		:param stories: List of user stories
+		:param vocabulary: Vocabulary of the cases, where the id of a case is its row in the matrices
+		:returns: List of records, and dictionary of the marks
+		"""
+		records = []
+		marks = {}
+		column = 0
+
+		for s, story in enumerate(self.progress.track("matrix", stories)):
+			parts = [[ROLE, story.role], [MEANS, story.means]]
+			# A mined user story has an ends indicator if and only if it has ends
+			if story.has_ends:
+				parts.append([ENDS, story.ends])
 
-	def score_means(self, token, story):
-		weight = 0
+			for part, us_part in parts:
+				for token in us_part.text:
+					records.append((s, vocabulary.get(get_case(token)), part, column if us_part.indicator else -1, token.idx, 0, token.i))
+				if us_part.indicator:
+					column += 1
 
-		if self.is_phrasal('means.main_object', token, story) == 1:
-			weight += self.VAL_MAIN_OBJ
-		elif self.is_phrasal('means.main_object', token, story) == 2:
-			weight += self.VAL_MAIN_OBJ * self.VAL_COMPOUND
+			# A duplicate shares the document of the user story it copies (see run.main), but its
+			# tokens are counted as its own, as if it was parsed separately (see remove_verbs)
+			for token in story.data:
+				records.append((s, vocabulary.get(get_case(token)), DATA, -1, token.idx, VERB if is_verb(token) else 0, token.i))
+
+			self.marks(s, story, marks)
+
+		return records, marks
+
+	def marks(self, s, story, marks):
+		"""Marks the tokens of a user story that are its functional role, main objects, free form
+		nouns or compounds, by their character offset (see vn.shared)
+
+		:param s: Position of the user story
+		:param story: User story
+		:param marks: Dictionary of key to the marks of the token, which is added to
+		"""
+		def mark(tokens, bit):
+			for token in tokens:
+				# Compounds of nouns are pairs of tokens, of which only the tokens are marked
+				if hasattr(token, 'idx'):
+					k = int(key(s, token.idx))
+					marks[k] = marks.get(k, 0) | bit
+
+		def mark_phrasal(phrasal, main, compound, phrase=None):
+			# The phrase of which the main is a list of tokens is not used
+			if type(phrasal.main) is list:
+				return
+			mark([phrasal.main], main)
+			mark(phrasal.compound, compound)
+			if phrase:
+				mark(phrasal.phrase, phrase)
+
+		def mark_free_form(part, bit):
+			if part.free_form and part.nouns:
+				mark(part.nouns, bit)
+				for compound in part.compounds:
+					mark(compound, bit)
+
+		mark_phrasal(story.role.functional_role, FR_MAIN, FR_COMPOUND)
+		mark_phrasal(story.means.main_object, MO_MAIN, MO_COMPOUND)
+		mark_free_form(story.means, MEANS_NOUN)
+		if story.ends.free_form:
+			mark_phrasal(story.ends.main_object, EO_MAIN, EO_COMPOUND, EO_PHRASE)
+			mark_free_form(story.ends, ENDS_NOUN)
 
-		if self.is_freeform('means', token, story) == 1:
-			weight += self.VAL_MEANS_NOUN
-		
-		return weight
+	def get_stories_list(self, rows, stories, vocabulary):
+		"""
+		:param rows: Ids of the cases
+		:returns: List of [case, numbers of the user stories], with a number for every occurrence of the case
+		"""
+		numbers = {row: [] for row in rows}
 
-	def score_ends(self, token, story):
-		weight = 0
-		
-		if story.ends.free_form:
-			if self.is_phrasal('ends.main_object', token, story) == 1 or self.is_phrasal('ends.main_object', token, story) == 2:
-				weight += self.VAL_ENDS_NOUN
-			elif self.is_freeform('ends', token, story) == 1:
-				weight += self.VAL_ENDS_NOUN
-		
-		return weight
-
-	def count_occurence(self, cm, sl, stories):
 		for story in stories:
 			for token in story.data:
-				c = get_case(token)
-				if c in cm.index.values:
-					for s in sl:
-						if s[0] == c:
-							s[1].append(story.number)					
-
-					if self.is_phrasal('role.functional_role', token, story) == 1:
-						cm = self.add(cm, c, 'Functional Role')
-					elif self.is_phrasal('role.functional_role', token, story) == 2:
-						cm = self.add(cm, c, 'Functional Role Compound')
-
-					if self.is_phrasal('means.main_object', token, story) == 1:
-						cm = self.add(cm, c, 'Main Object')
-					elif self.is_phrasal('means.main_object', token, story) == 2:
-						cm = self.add(cm, c, 'Main Object Compound')
-
-					if self.is_freeform('means', token, story) == 1:
-						cm = self.add(cm, c, 'Means Free Form Noun')
-					
-					if story.ends.free_form:
-						if self.is_phrasal('ends.main_object', token, story) > 0 or self.is_freeform('ends', token, story) == 1:
-							cm = self.add(cm, c, 'Ends Free Form Noun')
-					
-		return cm, sl
-
-	def get_role_means_ends(self, matrix, stories):
-		cases = matrix.index.values
-
-		for case in cases:
-			for story in stories:
-				if story.role.indicator:
-					if case in [get_case(token) for token in story.role.text]:
-						matrix.set_value(case, (story.txtnr(), 'Role'), 1)
-				if story.means.indicator:
-					if case in [get_case(token) for token in story.means.text]:
-						matrix.set_value(case, (story.txtnr(), 'Means'), 1)
-				if story.ends.indicator:
-					if case in [get_case(token) for token in story.ends.text]:
-						matrix.set_value(case, (story.txtnr(), 'Ends'), 1)
-								
-		return matrix
+				row = vocabulary.get(get_case(token))
+				if row in numbers:
+					numbers[row].append(story.number)
+
+		return [[vocabulary[row], numbers[row]] for row in rows]
+
+	def named(self, matrix, vocabulary):
+		"""
+		:param matrix: Matrix that is indexed by the ids of the cases
+		:param vocabulary: Vocabulary of the ids
+		:returns: Copy of the matrix that is indexed by the cases themselves, for output
+		"""
+		return matrix.rename(index=lambda row: vocabulary[row])
 
 	def add(self, matrix, index, column, by=1):
 		return matrix.set_value(index, column, matrix.at[index,column]+by)
@@ -195,28 +219,6 @@ class Matrix:
 			return True
 		return False
 
-	def is_phrasal(self, part, token, story):
-		spart = 'story.' + part
-		if type(eval(spart + '.main')) is list:
-			return -1
-		elif token == eval(spart + '.main'):
-			return 1
-		elif token in eval(spart + '.compound'):
-			return 2
-		elif token in eval(spart + '.phrase'):
-			return 3
-		return -1
-
-	def is_freeform(self, part, token, story):
-		spart = 'story.' + part
-		if eval(spart + '.free_form'):
-			if eval(spart + '.nouns'):
-				if token in eval(spart + '.nouns'):
-					return 1
-				elif eval(spart + '.compounds') and token in flatten(eval(spart + '.compounds')):
-					return 1
-		return -1
-
 	def _remove_from(self, matrix, to_drop):
 		for d in to_drop:
 			if d in matrix.index.values and matrix.loc[d, 'sum'] > 0:
@@ -224,7 +226,7 @@ class Matrix:
 
 		return matrix[~matrix.index.isin(to_drop)]
 
-	def remove_indicators(self, matrix, stories, nlp):
+	def remove_indicators(self, matrix, stories, nlp, vocabulary):
 		indicators = []
 
 		for story in stories:
@@ -232,26 +234,21 @@ class Matrix:
 			if story.has_ends:
 				ind += " " + story.ends.indicator
 
-			[indicators.append(get_case(t)) for t in nlp(ind)]
+			[indicators.append(vocabulary.get(get_case(t))) for t in nlp(ind)]
 
-			[indicators.append(i) for i in story.indicators]
+			[indicators.append(vocabulary.get(i)) for i in story.indicators]
 
 		return self._remove_from(matrix, indicators)
 
-	def remove_verbs(self, matrix, stories):
+	def remove_verbs(self, matrix, corpus, vocabulary):
 		verbs = []
-		cases = matrix.index.values.tolist()		
-
-		for case in cases:
-			pos = []
-
-			for story in stories:
-				for token in story.data:
-					if get_case(token) == case:
-						pos.append(token)
+		rows = matrix.index.values.tolist()
+		distinct, verb = corpus.distinct_tokens(len(vocabulary))
 
-			if len(set(pos)) == 1 and is_verb(pos[0]):
-				verbs.append(case)
+		# Cases of which all occurrences are the same token, which is a verb
+		for row in rows:
+			if distinct[row] == 1 and verb[row]:
+				verbs.append(row)
 
 		return self._remove_from(matrix, verbs)
 
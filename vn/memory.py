@@ -0,0 +1,74 @@
+''' Releasing the spaCy documents of mined user stories, which are replaced by records of the token
+attributes that the matrix, pattern and report stages use, and measuring the memory use
+'''
+
+import sys
+from spacy.tokens import Doc, Span
+from spacy.tokens.token import Token
+
+from vn.userstory import UserStory, UserStoryPart, WithMain
+from vn.utility import TokenList, TokenRecord, DocRecord
+
+try:
+	import resource
+except ImportError:
+	# Not available on Windows
+	resource = None
+
+
+def release_docs(story, docs=None):
+	"""Replaces the tokens, spans and documents of a mined user story by TokenRecords and
+	DocRecords, so that the spaCy documents can be freed. Parts that a duplicate shares with the
+	user story are replaced once.
+
+	:param story: Mined (and counted) user story
+	:param docs: Dictionary of the documents released so far (see compact), to share their records between user stories that share documents
+	:returns: The user story
+	"""
+	return compact(story, {} if docs is None else docs)
+
+def compact(value, docs):
+	"""
+	:param value: Value to replace the spaCy objects of, or to replace them in
+	:param docs: Dictionary of id(document) to (document, record), which is filled while replacing
+	:returns: Value with records instead of spaCy objects
+	"""
+	if isinstance(value, Token):
+		return doc_record(value.doc, docs)[value.i]
+	elif isinstance(value, Span):
+		return doc_record(value.doc, docs)[value.start:value.end]
+	elif isinstance(value, Doc):
+		return doc_record(value, docs)
+	elif isinstance(value, (TokenRecord, DocRecord, str)):
+		return value
+	elif type(value) is TokenList:
+		return TokenList(compact(v, docs) for v in value)
+	elif isinstance(value, list):
+		return [compact(v, docs) for v in value]
+	elif isinstance(value, tuple):
+		return tuple(compact(v, docs) for v in value)
+	elif isinstance(value, (UserStory, UserStoryPart, WithMain)):
+		# Only the user story and its parts hold spaCy objects, other objects are left as they are
+		for attr, v in list(vars(value).items()):
+			setattr(value, attr, compact(v, docs))
+	return value
+
+def doc_record(doc, docs):
+	# The document is kept in docs while replacing, so that its id is not reused
+	if id(doc) not in docs:
+		tokens = [TokenRecord(token) for token in doc]
+		record = DocRecord(tokens)
+		for token in tokens:
+			token.doc = record
+		docs[id(doc)] = (doc, record)
+	return docs[id(doc)][1]
+
+def peak_rss():
+	"""
+	:returns: Peak resident set size of the process in bytes, or None if it cannot be measured
+	"""
+	if resource is None:
+		return None
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	# Kilobytes, except on macOS
+	return peak if sys.platform == 'darwin' else peak * 1024
@@ -1,8 +1,73 @@
+import timeit
+import threading
+from spacy.tokens import Span
+
 from vn.utility import *
-from lang.en.indicators import *
+from lang.packs import DEFAULT_LANGUAGE, get_pack
+from vn.userstory import UserStory
+
+def parse(text, id, systemname, nlp, miner):
+	"""Create a new user story object and mines it to map all data in the user story text to a predefined model
+
+	:param text: The user story text
+	:param id: The user story ID, which can later be used to identify the user story
+	:param systemname: Name of the system this user story belongs to
+	:param nlp: Natural Language Processor (spaCy, or a vn.nlp.Backend)
+	:param miner: instance of class Miner
+	:returns: A new user story object
+	"""
+	miner.start()
+	no_double_space = normalize(text)
+	user_story = UserStory(id, text, no_double_space)
+	# The indicators are found on the tokens only, so that user stories without them are not parsed
+	user_story.data = nlp.tokenizer(no_double_space)
+	miner.structure(user_story)
+	user_story.system.main = nlp(systemname)[0]
+	user_story.data = nlp(no_double_space)
+	miner.check()
+	#Printer.print_dependencies(user_story)
+	#Printer.print_noun_phrases(user_story)
+	user_story.old_data = user_story.data
+	if not miner.single_parse:
+		user_story.data = nlp(user_story.sentence)
+		miner.check()
+	miner.mine(user_story, nlp)
+	return user_story
 
 class StoryMiner:
+	def __init__(self, single_parse=False, lang=DEFAULT_LANGUAGE, max_tokens=None, time_budget=None):
+		"""
+		:param single_parse: Mine the role, means and ends as spans of the parsed user story, instead of parsing each part separately
+		:param lang: Code of the language pack with the indicators of the user stories
+		:param max_tokens: Maximum number of tokens of a user story, above which it is not parsed, or None
+		:param time_budget: Maximum number of seconds to mine a user story in, or None
+		"""
+		self.single_parse = single_parse
+		self.pack = get_pack(lang)
+		self.max_tokens = max_tokens
+		self.time_budget = time_budget
+		# User stories can be mined in multiple threads (see vn.api), which each have their own deadline
+		self.budget = threading.local()
+
+	def start(self):
+		"""Starts the time budget of a user story in the current thread"""
+		self.budget.deadline = timeit.default_timer() + self.time_budget if self.time_budget else None
+
+	def check(self):
+		"""Stops mining the user story of the current thread if its time budget is used up
+
+		The budget is checked between the steps of mining, as spaCy cannot be interrupted while
+		parsing. The time of parsing is limited by max_tokens instead.
+		"""
+		deadline = getattr(self.budget, 'deadline', None)
+		if deadline is not None and timeit.default_timer() > deadline:
+			raise ValueError('Exceeded the time budget of ' + str(self.time_budget) + ' s', 6)
+
 	def structure(self, story):
+		if self.max_tokens and len(story.data) > self.max_tokens:
+			raise ValueError('Too many tokens (' + str(len(story.data)) + ', at most ' + str(self.max_tokens) + ')', 5)
+
+		story.lang = self.pack.code
 		story = self.get_indicators(story)
 
 		if not story.role.indicator:
@@ -15,6 +80,7 @@ class StoryMiner:
 	def mine(self, story, nlp):
 		story = self.get_part_text(story)
 		story = self.nlp_part(story, nlp)
+		self.check()
 
 		story = self.get_functional_role(story)
 		if not story.role.functional_role:
@@ -28,58 +94,15 @@ class StoryMiner:
 		
 		if story.has_ends:
 			story = self.get_mobj_and_mv(story, 'ends')
+		self.check()
 
 		story = self.get_free_form(story)
 
 	# New method
 	def get_indicators(self, story):
-		indicator_types = ['Role', 'Means', 'Ends']
-		returnlist = []
-
-		for indicator_type in indicator_types:
-			found_ind = []
-			found_i = []
-
-			l_sentence = str.lower(story.sentence)
-
-			for indicator in eval(indicator_type.upper() + '_INDICATORS'):
-				if indicator_type.lower() == 'role':
-					i = str.lower(indicator) + " "
-				else:
-					i = " " + str.lower(indicator) + " "
-
-				if i in l_sentence:
-					found_ind.append([l_sentence.find(i), indicator])
-
-			# Get the one(s) at the lowest index			
-			places = [i[0] for i in found_ind]
-			if places:
-				p_min = min(places)
-			else:
-				p_min = -1
-
-			for i in found_ind:
-				if i[0] > p_min:
-					found_ind.remove(i)
-			for i in found_ind:
-				found_i.append(i[1])
-
-			# If multiple remain, get the longest match
-			if found_i:
-				if len(found_i) > 1:
-					returnlist.append([max(found_i, key=len), p_min])
-				else:
-					returnlist.append([found_i[0], p_min])
-			else:
-				returnlist.append(['', p_min])
-			
-		story.role.indicator = returnlist[0][0]
-		story.means.indicator = returnlist[1][0]
-		story.ends.indicator = returnlist[2][0]
-
-		story.role.indicator_i = returnlist[0][1]
-		story.means.indicator_i = returnlist[1][1]
-		story.ends.indicator_i = returnlist[2][1]
+		story.role.indicator, story.role.indicator_i = self.pack.find('role', story.sentence)
+		story.means.indicator, story.means.indicator_i = self.pack.find('means', story.sentence)
+		story.ends.indicator, story.ends.indicator_i = self.pack.find('ends', story.sentence)
 
 		if story.ends.indicator_i > -1 and story.ends.indicator != '':
 			story.has_ends = True
@@ -95,7 +118,7 @@ class StoryMiner:
 
 	def get_I(self, story):
 		for token in story.data:
-			if token.text == 'I':
+			if token.text == self.pack.pronoun:
 				story.iloc.append(token.i)
 
 		return story
@@ -110,20 +133,15 @@ class StoryMiner:
 			story.means.t = story.sentence[len(story.means.indicator) + story.means.indicator_i + 1:]
 
 		#BC: story.means.simplified = 'I' + story.means.t
-		story.means.simplified = 'I can' + story.means.t
+		story.means.simplified = self.pack.means_prefix + story.means.t
 
 		if story.has_ends and story.ends.indicator_i > story.means.indicator_i:
-			if str.lower(story.ends.t[:1]) == 'i':
-				#BC if str.lower(story.ends.t[:5]) == 'i can':
-				#BC	story.ends.simplified = 'I ' + story.ends.t[6:]
-				#BC elif str.lower(story.ends.t[:12]) == 'i am able to':
-				if str.lower(story.ends.t[:12]) == 'i am able to':
-					#BC story.ends.simplified = 'I ' + story.ends.t[13:]
-					story.ends.simplified = 'I can' + story.ends.t[13:]
-				else:
-					story.ends.simplified = story.ends.t
-			else:
-				story.ends.simplified = story.ends.t
+			story.ends.simplified = story.ends.t
+			#BC if str.lower(story.ends.t[:5]) == 'i can':
+			#BC	story.ends.simplified = 'I ' + story.ends.t[6:]
+			for able_to in self.pack.able_to:
+				if str.lower(story.ends.t[:len(able_to)]) == able_to:
+					story.ends.simplified = self.pack.means_prefix + story.ends.t[len(able_to) + 1:]
 
 		if story.has_ends and story.ends.indicator_i <= story.means.indicator_i:
 			story.has_ends = False
@@ -133,6 +151,9 @@ class StoryMiner:
 		return story
 
 	def nlp_part(self, story, nlp):
+		if self.single_parse:
+			return self.span_part(story, nlp)
+
 		story.role.text = nlp(story.role.t)
 		story.means.text = nlp(story.means.simplified)
 		if story.has_ends:
@@ -140,13 +161,34 @@ class StoryMiner:
 
 		return story
 
+	def span_part(self, story, nlp):
+		role_start = len(story.role.indicator) + 1
+		means_start = len(story.means.indicator) + story.means.indicator_i + 1
+		means_end = len(story.sentence)
+
+		story.role.text = MinerUtility.get_part_span(story.data, role_start, story.means.indicator_i)
+
+		if story.has_ends:
+			means_end = story.ends.indicator_i
+			# 'I am able to' is simplified to 'I can', which is not part of the user story, so it is parsed separately
+			if story.ends.simplified == story.ends.t:
+				story.ends.text = MinerUtility.get_part_span(story.data, len(story.ends.indicator) + story.ends.indicator_i + 2, len(story.sentence))
+			else:
+				story.ends.text = nlp(story.ends.simplified)
+
+		story.means.text = MinerUtility.get_part_span(story.data, means_start, means_end)
+		if not len(story.means.text):
+			raise ValueError('Could not find a main verb', 4)
+
+		return story
+
 	def get_functional_role(self, story):
 		potential_without_with = []
 
 		with_i = -1
 		for token in story.role.text:
-			if MinerUtility.lower(token.text) == 'with' or MinerUtility.lower(token.text) == 'w/':
-				with_i = token.i
+			if MinerUtility.lower(token.text) in self.pack.with_words:
+				with_i = token.i - story.role.text[0].i
 		if with_i > 0:
 			potential_without_with = story.role.text[0:with_i]
 		else:
@@ -176,7 +218,7 @@ class StoryMiner:
 			# Get head of tree
 			else:
 				for token in story.role.text:
-					if token is token.head:
+					if MinerUtility.is_root(token, story.role.text):
 						story.role.functional_role.main = token
 
 		return story
@@ -191,22 +233,23 @@ class StoryMiner:
 		main_verb = []
 		main_object = []
 		mv_phrase = []
+		part_text = get_attr(story, part + '.text')
 
 		# Simple case if the subj and dobj are linked by a verb
-		for token in eval('story.' + str(part) + '.text'):
+		for token in part_text:
 			if is_subject(token):
 				has_subj = True
 				subject = token
 				#BC if is_verb(token.head):
-				if is_verb(token.head) and str.lower(token.head.text) != 'can':
+				if is_verb(token.head) and str.lower(token.head.text) != self.pack.modal:
 					found_verb = True
 					main_verb = token.head
 					break
 
 		if type(subject) is list:
-			subject = eval('story.' + str(part) + '.text')[0]
+			subject = part_text[0]
 
-		for token in eval('story.' + str(part) + '.text'):
+		for token in part_text:
 			if is_dobj(token):
 				found_obj = True
 
@@ -238,8 +281,8 @@ class StoryMiner:
 	
 		# If the root of the sentence is a verb
 		if not simple:
-			for token in eval('story.' + str(part) + '.text'):
-				if token.dep_ == 'ROOT' and is_verb(token):
+			for token in part_text:
+				if MinerUtility.is_root(token, part_text) and is_verb(token):
 					found_verb = True
 					main_verb = token
 					break
@@ -248,14 +291,16 @@ class StoryMiner:
 		# Possibly a NLP error...
 		if not found_verb:
 		#BC 	main_verb = eval('story.' + str(part) + '.text')[1]
-			if str(part) == 'means' or str.lower(eval('story.' + str(part) + '.text')[1].text) == 'can':
-				main_verb = eval('story.' + str(part) + '.text')[2]
+			if str(part) == 'means' and self.single_parse:
+				main_verb = story.means.text[0]
+			elif str(part) == 'means' or str.lower(part_text[1].text) == self.pack.modal:
+				main_verb = part_text[2]
 			else:
-				main_verb = eval('story.' + str(part) + '.text')[1]
+				main_verb = part_text[1]
 
 		# If the sentence contains no dobj it must be another obj
 		if not found_obj:
-			for token in eval('story.' + str(part) + '.text'):
+			for token in part_text:
 				if token.dep_[1:] == 'obj':
 					found_obj = True
 					main_object = token
@@ -281,20 +326,20 @@ class StoryMiner:
 				story.ends.main_verb.type = "II"
 
 		if type(main_object) is list or main_object == story.system.main:
-			story = eval('self.get_' + str(part) + '_phrases(story, ' + str(found_mv_phrase) + ', False)')
+			story = getattr(self, 'get_' + str(part) + '_phrases')(story, found_mv_phrase, False)
 		else:
-			story = eval('self.get_' + str(part) + '_phrases(story, ' + str(found_mv_phrase) + ')')
+			story = getattr(self, 'get_' + str(part) + '_phrases')(story, found_mv_phrase)
 
 		return story
 
 	def get_means_phrases(self, story, found_mv_phrase, assume=True):
 		if assume:
-			for np in story.means.text.noun_chunks:
+			for np in MinerUtility.noun_chunks(story.means.text):
 				if story.means.main_object.main in np:
-					story.means.main_object.phrase = np
+					story.means.main_object.phrase = TokenList(np)
 			if story.means.main_object.phrase:
 				m = story.means.main_object.main
-				if m.i > 0 and is_compound(m.nbor(-1)) and m.nbor(-1).head == m:
+				if m.i > story.means.text[0].i and is_compound(m.nbor(-1)) and m.nbor(-1).head == m:
 					story.means.main_object.compound = [m.nbor(-1), m]
 				else:
 					for token in story.means.main_object.phrase:
@@ -310,12 +355,12 @@ class StoryMiner:
 
 	def get_ends_phrases(self, story, found_mv_phrase, assume=True):
 		if assume:
-			for np in story.ends.text.noun_chunks:
+			for np in MinerUtility.noun_chunks(story.ends.text):
 				if story.ends.main_object.main in np:
-					story.ends.main_object.phrase = np
+					story.ends.main_object.phrase = TokenList(np)
 			if story.ends.main_object.phrase:
 				m = story.ends.main_object.main
-				if m.i > 0 and is_compound(m.nbor(-1)) and m.nbor(-1).head == m:
+				if m.i > story.ends.text[0].i and is_compound(m.nbor(-1)) and m.nbor(-1).head == m:
 					story.ends.main_object.compound = [m.nbor(-1), m]
 				else:
 					for token in story.ends.main_object.phrase:
@@ -324,10 +369,10 @@ class StoryMiner:
 
 		ends_subj = story.ends.subject.main
 
-		if str.lower(story.ends.subject.main.text) != '' and str.lower(story.ends.subject.main.text) != 'i':
-			for np in story.ends.text.noun_chunks:
+		if str.lower(story.ends.subject.main.text) != '' and str.lower(story.ends.subject.main.text) != str.lower(self.pack.pronoun):
+			for np in MinerUtility.noun_chunks(story.ends.text):
 				if story.ends.subject.main in np:
-					story.ends.subject.phrase = np
+					story.ends.subject.phrase = TokenList(np)
 		
 			if story.ends.subject.phrase:
 				for token in story.ends.subject.phrase:
@@ -354,11 +399,12 @@ class StoryMiner:
 		main_obj.append(story.means.main_object.main)
 		main_obj.extend(story.means.main_object.phrase)		
 
-		means_not_ff = main_verb + main_obj
+		means_not_ff = TokenList(main_verb + main_obj)
 
 		# Exclude these from the free form
-		for token in story.means.text:
-			if token not in means_not_ff and token.i > 0: 
+		# Exclude the 'I' of 'I can' that precedes the means when it is parsed separately
+		for i, token in enumerate(story.means.text):
+			if token not in means_not_ff and (i > 0 or self.single_parse):
 				means_free_form.append(token)
 		
 		story.means.free_form = MinerUtility.get_span(story, means_free_form, 'means.text')
@@ -368,13 +414,14 @@ class StoryMiner:
 		
 		# Extract useful information from free form
 		if story.means.free_form or story.has_ends:
-			self.get_ff_subj_dobj(story)
 			self.get_ff_verbs(story)
 			self.get_ff_nouns(story)
+			self.check()
 			if story.means.free_form:
 				story.means.proper_nouns = MinerUtility.get_proper_nouns(story, story.means.nouns)
 				story.means.noun_phrases = MinerUtility.get_noun_phrases(story, story.means.free_form)
 				story.means.compounds = MinerUtility.get_compound_nouns(story, story.means.free_form)
+				self.check()
 			if story.has_ends:
 				story.ends.proper_nouns = MinerUtility.get_proper_nouns(story, story.ends.nouns)
 				story.ends.noun_phrases = MinerUtility.get_noun_phrases(story, story.ends.free_form)
@@ -382,15 +429,6 @@ class StoryMiner:
 
 		return story
 
-	def get_ff_subj_dobj(self, story):
-		story.means.nouns = MinerUtility.get_subj(story, story.means.free_form)
-		story.ends.nouns = MinerUtility.get_subj(story, story.ends.free_form)
-
-		story.means.nouns = MinerUtility.get_dobj(story, story.means.free_form)
-		story.ends.nouns = MinerUtility.get_dobj(story, story.ends.free_form)
-
-		return story
-
 	def get_ff_nouns(self, story):
 		story.means.nouns = MinerUtility.get_nouns(story, story.means.free_form)
 		story.ends.nouns = MinerUtility.get_nouns(story, story.ends.free_form)	
@@ -416,11 +454,49 @@ class MinerUtility:
 
 	# Fixes that spaCy dependencies are not spans, but temporary objects that get deleted when loaded into memory
 	def get_span(story, li, part='data'):
-		ret = []
-		idxlist = get_idx(li)
-		for i in idxlist:
-			ret.append(eval('story.' + str(part))[i])
-		return ret
+		"""Gets the tokens of a part of a user story at the positions of a list of tokens
+
+		:param story: User story
+		:param li: List of tokens
+		:param part: Attribute of the user story with the document to take the tokens from
+		:returns: TokenList
+		"""
+		doc = get_attr(story, part)
+		if type(doc) is Span:
+			doc = doc.doc
+		return TokenList(doc[i] for i in get_idx(li))
+
+	def get_part_span(doc, start, end):
+		"""Gets the tokens of a document that start within a range of characters
+
+		:param doc: Document
+		:param start: Index of the first character
+		:param end: Index after the last character
+		:returns: Span
+		"""
+		tokens = [token.i for token in doc if start <= token.idx < end]
+		if tokens:
+			return doc[tokens[0]:tokens[-1] + 1]
+		return doc[0:0]
+
+	def noun_chunks(part):
+		if type(part) is Span:
+			return [chunk for chunk in part.doc.noun_chunks if chunk.start >= part.start and chunk.end <= part.end]
+		return part.noun_chunks
+
+	def is_root(token, part):
+		"""Sees if a token is the root of a part, where the root of a span of a larger document has its
+		head outside the span
+
+		:param token: Token
+		:param part: Document or span of a part
+		:returns: Boolean
+		"""
+		if token.dep_ == 'ROOT' or token is token.head:
+			return True
+		if type(part) is Span:
+			return token.head.i < part.start or token.head.i >= part.end
+		return False
 
 	# Obtain noun phrases (including form 'x of y')
 	'''
@@ -451,14 +527,14 @@ class MinerUtility:
 
 	# Obtain Type I, II and III phrasal verbs
 	def get_phrasal_verb(story, head, part='data'):
-		particles = TYPE_II_PARTICLES + TYPE_II_PARTICLES_MARGINAL
+		particles = get_pack(story.lang).particles
 		phrasal_verb = head
 		phrase = []
 		mobj_i = 1000
 		vtype = ""
 
 		if part == 'means.text' or part == 'ends.text':
-			for token in eval('story.' + str(part)):
+			for token in get_attr(story, part):
 				if token.dep_ == 'dobj':
 					mobj_i = token.i
 					break
@@ -468,7 +544,7 @@ class MinerUtility:
 			phrase.append(phrasal_verb)
 			vtype = "II"
 		else:
-			for chunk in eval('story.' + str(part) + '.noun_chunks'):
+			for chunk in MinerUtility.noun_chunks(get_attr(story, part)):
 				for c in phrasal_verb.children:
 					if c == chunk.root.head and c.i < mobj_i:
 						if c.pos_ == 'PART':
@@ -510,7 +586,7 @@ class MinerUtility:
 			if is_noun(token):
 				nouns.append(token)
 
-		return nouns
+		return TokenList(nouns)
 
 	def get_proper_nouns(story, nouns):
 		proper = []
@@ -522,34 +598,40 @@ class MinerUtility:
 		return proper
 
 	def get_compound_nouns(story, span):
+		"""Gets the compounds of the nouns in a span in one pass over their children, where a compound
+		left of its noun replaces the earlier compounds that either of them is in (so that the rightmost
+		compound is kept)
+
+		:param story: User story
+		:param span: Tokens to get the compound nouns of
+		:returns: List of [compound, noun]
+		"""
 		compounds = []
-		nouns = MinerUtility.get_nouns(story, span)
+		kept = []
+		positions = {}
 
-		for token in nouns:
+		for token in MinerUtility.get_nouns(story, span):
 			for child in token.children:
 				if is_compound(child):
 					# Replace to take rightmost child
 					if child.idx < token.idx:
-						for compound in compounds:
-							if child in compound or token in compound:
-								compounds.remove(compound)
+						for i in positions.pop(child.idx, []) + positions.pop(token.idx, []):
+							kept[i] = False
+					positions.setdefault(child.idx, []).append(len(compounds))
+					positions.setdefault(token.idx, []).append(len(compounds))
 					compounds.append([child, token])
-		
-		for c in compounds:
-			c = MinerUtility.get_span(story, c)
-
-		if compounds and len(compounds) == 0 and type(compounds[0]) is list:
-			compounds = compounds[0]
+					kept.append(True)
 
-		return compounds
+		return [compound for compound, keep in zip(compounds, kept) if keep]
 
 	def get_noun_phrases(story, span, part='data'):
 		phrases = []
-		
-		for chunk in eval('story.' + str(part) + '.noun_chunks'):
+		tokens = set(span)
+
+		for chunk in MinerUtility.noun_chunks(get_attr(story, part)):
 			chunk = MinerUtility.get_span(story, chunk)
-			if is_sublist(chunk, span):
-				phrases.append(MinerUtility.get_span(story, chunk))
+			if tokens.issuperset(chunk):
+				phrases.append(chunk)
 
 		return phrases
 
@@ -557,7 +639,7 @@ class MinerUtility:
 		verbs = []
 
 		for token in span:
-			if is_verb(token) and str.lower(token.text) != 'can':
+			if is_verb(token) and str.lower(token.text) != get_pack(story.lang).modal:
 				verbs.append(token)
 
 		return MinerUtility.get_span(story, verbs)
@@ -0,0 +1,123 @@
+import abc
+import pickle
+import importlib
+import threading
+
+import spacy
+from spacy.tokens import Doc
+
+DEFAULT_MODEL = "en_core_web_md"
+
+class Backend(abc.ABC):
+	"""Natural Language Processor used by Visual Narrator
+
+	Calling a backend with a text returns a document with the attributes of a spaCy Doc (tokens with
+	a part-of-speech, dependency, lemma and shape, and noun chunks). Its tokenizer returns a document
+	with only the tokens, which is enough to find the indicators of a user story.
+	"""
+	name = ""
+
+	@abc.abstractmethod
+	def __call__(self, text):
+		pass
+
+	def tokenizer(self, text):
+		return self(text)
+
+
+class SpacyBackend(Backend):
+	def __init__(self, model=DEFAULT_MODEL):
+		"""
+		:param model: Name of an installed spaCy model package (e.g. en_core_web_sm) or shortcut link (e.g. en)
+		"""
+		self.name = model
+		try:
+			self.nlp = importlib.import_module(model).load()
+		except ImportError:
+			self.nlp = spacy.load(model)
+		self.vocab = self.nlp.vocab
+		self.tokenizer = self.nlp.tokenizer
+
+	def __call__(self, text):
+		return self.nlp(text)
+
+
+class CachedBackend(Backend):
+	"""Keeps the document of every text parsed by another backend, so that texts that recur (such as
+	the system name, or user stories that are mined again) are parsed once. The documents can be
+	saved to a file, and loaded as annotation source for later runs.
+
+	The documents are kept serialized, and every call returns a new document, so that documents of
+	the same text (e.g. the data and old_data of a user story) are separate objects, as if they were
+	parsed again.
+	"""
+	def __init__(self, backend, filename=None):
+		"""
+		:param backend: Backend to parse texts that are not in the cache with
+		:param filename: File with previously saved documents
+		"""
+		self.backend = backend
+		self.name = backend.name + " (cached)"
+		self.vocab = backend.vocab
+		self.tokenizer = backend.tokenizer
+		self.docs = {}
+		self.hits = 0
+		self.misses = 0
+
+		if filename:
+			self.load(filename)
+
+	def __call__(self, text):
+		if text in self.docs:
+			self.hits += 1
+			return Doc(self.vocab).from_bytes(self.docs[text])
+
+		self.misses += 1
+		doc = self.backend(text)
+		self.docs[text] = doc.to_bytes()
+		return doc
+
+	def load(self, filename):
+		with open(filename, 'rb') as f:
+			self.docs.update(pickle.load(f))
+
+	def save(self, filename):
+		with open(filename, 'wb') as f:
+			pickle.dump(self.docs, f)
+
+
+class LockedBackend(Backend):
+	"""Serializes the calls of another backend, so that it can be shared by threads (see vn.api).
+	Neither the spaCy tokenizer, with its cache, nor a CachedBackend can be called from multiple
+	threads at the same time.
+	"""
+	def __init__(self, backend):
+		"""
+		:param backend: Backend (or spaCy Language) to call one at a time
+		"""
+		self.backend = backend
+		self.name = getattr(backend, 'name', '')
+		self.vocab = backend.vocab
+		self.lock = threading.Lock()
+
+	def __call__(self, text):
+		with self.lock:
+			return self.backend(text)
+
+	def tokenizer(self, text):
+		with self.lock:
+			return self.backend.tokenizer(text)
+
+
+def load_backend(model=DEFAULT_MODEL, cache=False, filename=None):
+	"""Loads a Natural Language Processor
+
+	:param model: Name of the spaCy model
+	:param cache: Cache the parsed documents
+	:param filename: File with previously saved documents, to use as cache
+	:returns: Backend
+	"""
+	backend = SpacyBackend(model)
+	if cache or filename:
+		backend = CachedBackend(backend, filename)
+	return backend
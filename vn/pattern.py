@@ -1,24 +1,41 @@
 import string
+import bisect
+import functools
 import numpy as np
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 import pandas
 from enum import Enum
 
-from vn.generator import Generator, Ontology
-from vn.utility import Printer, WeightedToken, get_case, is_sublist
+from lang.packs import get_pack
+from vn.generator import Generator, Ontology, Prolog
+from vn.progress import Progress
+from vn.utility import Printer, WeightedToken, WeightedTokenPool, get_attr, get_case, is_sublist, flatten
 
 class Constructor:
-	def __init__(self, nlp, user_stories, matrix):
+	def __init__(self, nlp, user_stories, matrix, progress=None, vocabulary=None):
+		"""
+		:param nlp: Natural Language Processor (spaCy)
+		:param user_stories: List of mined user stories
+		:param matrix: Term-by-user story matrix
+		:param progress: Progress to report the user stories done to (see vn.progress)
+		:param vocabulary: Vocabulary of which the ids index the matrix (see vn.matrix), or None if it is indexed by the cases
+		"""
 		self.nlp = nlp
+		self.progress = progress
 		self.user_stories = user_stories
-		self.weights = matrix['sum'].reset_index().values.tolist()
+		self.story_index = {story.number: story for story in user_stories}
+		self.part_cases = {}
+		self.vocabulary = vocabulary
+		self.weights = list(zip(matrix.index.tolist(), matrix['sum'].tolist()))
 
-	def make(self, ontname, threshold, link):
-		weighted_tokens = WeightAttacher.make(self.user_stories, self.weights)
+	def make(self, ontname, threshold, link, per_role=True):
+		weighted_tokens = WeightAttacher.make(self.user_stories, self.weights, self.vocabulary)
 		
-		self.onto = Ontology(ontname, self.user_stories)
-		self.prolog = Ontology(ontname, self.user_stories)
+		self.onto = Ontology(ontname, self.user_stories, vocabulary=weighted_tokens.vocabulary)
+		self.prolog = Prolog()
 
-		pf = PatternFactory(self.onto, self.prolog, weighted_tokens)
+		pf = PatternFactory(self.onto, self.prolog, weighted_tokens, self.progress)
 		self.onto = pf.make_patterns(self.user_stories, threshold)
 		self.prolog = pf.prolog
 
@@ -26,18 +43,24 @@ class Constructor:
 			self.link_to_story(self.onto.classes, self.user_stories)
 
 		g = Generator(self.onto.classes, self.onto.relationships)
-		g_prolog = Generator(self.prolog.classes, self.prolog.relationships, False)
 
 		per_role_out = []
-		per_role_onto = self.get_per_role(self.user_stories, link)
+		if per_role:
+			per_role_onto = self.get_per_role(self.user_stories, link)
 
-		for p in per_role_onto:
-			per_role_out.append([p[0].replace('/','_'), p[1].prt(self.onto)])
+			# Sort once, so that the per role generators can print concurrently
+			for c in self.onto.classes:
+				c.stories.sort()
 
-		return g.prt(self.onto), g_prolog.prt(self.prolog), self.onto, self.prolog, per_role_out
+			with ThreadPoolExecutor() as executor:
+				outputs = executor.map(lambda p: p[1].gen_ontology(self.onto), per_role_onto)
+				for p, output in zip(per_role_onto, outputs):
+					per_role_out.append([p[0].replace('/','_'), output])
+
+		return g.prt(self.onto), self.prolog.prt(), self.onto, self.prolog, per_role_out
 
 	def link_to_story(self, classes, stories):	
-		used_stories = []
+		used_stories = {}
 
 		for cl in classes:
 			for story in cl.stories:
@@ -54,82 +77,124 @@ class Constructor:
 					for part in parts:					
 						self.prolog.new_relationship(-1, cl.name, part, s.txtnr())
 
-					used_stories.append(s.txtnr())
+					used_stories[s.txtnr()] = True
 		
 		for story in used_stories:
 			self.onto.get_class_by_name(-1, story, 'UserStory')
 
 	def get_per_role(self, stories, link):	
-		roles_link = []
-		roles = []
-		stories_per_role = []
+		roles = {}
 		per_role_ontos = []
 
-		# Get a list of roles and a list where the stories are linked to their roles
-		for story in self.user_stories:
-			roles_link.append([story.role.t, story.number])
-			if str.lower(story.role.t) not in [str.lower(s) for s in roles]:
-				roles.append(story.role.t)
+		# Get the stories per role, where roles are compared case insensitively
+		for story in stories:
+			role = str.lower(story.role.t)
+			if role not in roles:
+				roles[role] = [story.role.t, set()]
+			roles[role][1].add(story.number)
 
-		# Get a list of stories per role and get the generator object for these stories
-		for role in roles:
-			stories_per_role = []
-			for link in roles_link:
-				if str.lower(role) == str.lower(link[0]):
-					stories_per_role.append(link[1])
+		self.index_ontology()
 
-			per_role_ontos.append([role, self.get_generator(role, stories_per_role, link)])
+		# Get the generator object for the stories of each role
+		for role, spr in roles.values():
+			per_role_ontos.append([role, self.get_generator(role, spr, link)])
 
 		return per_role_ontos
 
-	def get_generator(self, role, spr, link):		
+	def index_ontology(self):
+		"""Indexes the classes and relationships of the ontology by story and by name, so that
+		the ontology for a role can be retrieved without scanning all classes and relationships
+
+		Positions refer to the order of self.onto.classes and self.onto.relationships, which
+		determines the order of the output
+		"""
+		self.classes_per_story = {}
+		self.classes_per_name = {}
+		self.general_classes = set()
+		self.rels_per_story = {}
+		self.rels_per_range = {}
+
+		for pos, cl in enumerate(self.onto.classes):
+			for story in cl.stories:
+				if story >= 0:
+					self.classes_per_story.setdefault(story, set()).add(pos)
+			self.classes_per_name.setdefault(cl.name, []).append(pos)
+
+			# Get the general classes
+			if cl.stories[0] == -1 and (cl.name == 'FunctionalRole' or cl.name == 'Person'):
+				self.general_classes.add(pos)
+
+		for pos, rel in enumerate(self.onto.relationships):
+			for story in rel.stories:
+				self.rels_per_story.setdefault(story, set()).add(pos)
+			self.rels_per_range.setdefault(rel.range, []).append(pos)
+
+	def get_generator(self, role, spr, link):
+		classes = self.onto.classes
+		relationships = self.onto.relationships
 		role_classes = []
 		role_relationships = []
-		cl_names = []
+		cl_names = set()
 
 		# Get classes
-		for cl in self.onto.classes:
-			for story in cl.stories:
-				if story >= 0 and story in spr and cl.name not in cl_names:
-					role_classes.append(cl)
-					cl_names.append(cl.name)
-					if cl.parent != '':
-						for cp in self.onto.classes:
-							if cp.name == cl.parent:
-								role_classes.append(cp)
+		cl_pos = set()
+		for story in spr:
+			cl_pos.update(self.classes_per_story.get(story, ()))
+
+		for pos in sorted(cl_pos | self.general_classes):
+			cl = classes[pos]
+			if pos in cl_pos and cl.name not in cl_names:
+				role_classes.append(cl)
+				cl_names.add(cl.name)
+				if cl.parent != '':
+					for cp in self.classes_per_name.get(cl.parent, []):
+						role_classes.append(classes[cp])
+			if pos in self.general_classes:
+				role_classes.append(cl)
 
-			# Get the general classes
-			if cl.stories[0] == -1:
-				if cl.name == 'FunctionalRole' or cl.name == 'Person':
-					role_classes.append(cl)
-		
 		story_classes = []
+		story_names = set()
+		rel_pos = set()
+		for story in spr:
+			rel_pos.update(self.rels_per_story.get(story, ()))
+
+		# If 'link' add the relationships to the stories of this role too
+		if link:
+			for story in spr:
+				story_name = 'US' + str(story)
+				story_names.add(story_name)
+				rel_pos.update(self.rels_per_range.get(story_name, []))
 
 		# Get all relationships belonging to these classes
-		for rel in self.onto.relationships:
-			for story in rel.stories:
-				if rel.domain in cl_names and rel.range in cl_names and story in spr:
+		for pos in sorted(rel_pos):
+			rel = relationships[pos]
+			if rel.domain in cl_names:
+				if rel.range in cl_names:
+					for story in rel.stories:
+						if story in spr:
+							role_relationships.append(rel)
+				if rel.range in story_names:
 					role_relationships.append(rel)
-
-			# If 'link' add these classes too
-			if link:
-				for story in spr:
-					if rel.domain in cl_names and rel.range == 'US' + str(story):
-						role_relationships.append(rel)
-						story_classes.append(rel.range)
+					story_classes.append(rel.range)
 
 		# Retrieve all classes for the relationships created in link
 		if link:
-			for cl in self.onto.classes:
-				for c in story_classes:
-					if cl.name == c:
-						role_classes.append(cl)
+			story_classes = Counter(story_classes)
+			link_pos = []
+			for name in set(story_classes) | {'UserStory'}:
+				link_pos.extend(self.classes_per_name.get(name, []))
+			for pos in sorted(link_pos):
+				cl = classes[pos]
 				if cl.name == 'UserStory':
 					role_classes.append(cl)
+				else:
+					role_classes.extend([cl] * story_classes[cl.name])
 
 		return Generator(role_classes, role_relationships)
 
 	def get_story(self, nr, stories):
+		if stories is self.user_stories:
+			return self.story_index.get(nr, False)
 		for story in stories:
 			if nr == story.number:
 				return story
@@ -137,105 +202,111 @@ class Constructor:
 
 	def get_parts(self, class_name, story):
 		case = class_name.split()
-
-		means_compounds = []
-		means_compounds.append(story.means.main_object.compound)
-		ends_compounds = flatten(story.ends.compounds)
-
-		if story.means.free_form:
-			if len(story.means.compounds) > 0:
-				means_compounds.extend(flatten(story.means.compounds))
-
-		role = []
-		means = []
-		ends = []
+		role, means, ends = self.get_part_cases(story)[len(case) != 1]
+		case = set(case)
 		rme = []
 
-		for token in story.data:
-			if token in story.role.text:
-				if len(case) != 1:
-					role.append(get_case(token))
-				elif token not in story.role.functional_role.compound:
-					role.append(get_case(token))
-			if token in story.means.text:
-				if len(case) != 1:
-					means.append(get_case(token))
-				elif token not in means_compounds:
-					means.append(get_case(token))
-			if story.has_ends:
-				if token in story.ends.text:
-					if len(case) != 1:
-						ends.append(get_case(token))
-					elif token not in ends_compounds:
-						ends.append(get_case(token))
-
-		if is_sublist(case, role):
+		if case.issubset(role):
 			rme.append('Role')
 
-		if is_sublist(case, means):
+		if case.issubset(means):
 			rme.append('Means')
 
-		if is_sublist(case, ends):
+		if case.issubset(ends):
 			rme.append('Ends')
 
 		return rme
+
+	def get_part_cases(self, story):
+		"""Gets the cases of the tokens of a user story per part (role, means and ends)
+
+		:param story: A user story
+		:returns: Cases per part excluding compounds (for single word classes) and including compounds (for compound classes)
+		"""
+		if story.number in self.part_cases:
+			return self.part_cases[story.number]
+
+		# Tokens are compared on their character offset, like spaCy compares tokens
+		role_i = set(t.idx for t in story.role.text)
+		means_i = set(t.idx for t in story.means.text)
+		ends_i = set(t.idx for t in story.ends.text) if story.has_ends else set()
+
+		role_compounds = set(t.idx for t in story.role.functional_role.compound)
+		means_compounds = set(t.idx for t in story.means.main_object.compound)
+		if story.means.free_form:
+			means_compounds.update(t.idx for t in flatten(story.means.compounds))
+		ends_compounds = set(t.idx for t in flatten(story.ends.compounds))
+
+		parts = [(role_i, role_compounds), (means_i, means_compounds), (ends_i, ends_compounds)]
+		single = (set(), set(), set())
+		compound = (set(), set(), set())
+
+		for token in story.data:
+			c = get_case(token)
+			for part, (part_i, compounds) in enumerate(parts):
+				if token.idx in part_i:
+					compound[part].add(c)
+					if token.idx not in compounds:
+						single[part].add(c)
+
+		self.part_cases[story.number] = (single, compound)
+		return self.part_cases[story.number]
 			
 					
 class WeightAttacher:
-	def make(stories, weights):
-		weighted_tokens = []
-		indices = [weight[0] for weight in weights]
-		w = 0.0
-		c = ""
+	def make(stories, weights, vocabulary=None):
+		pool = WeightedTokenPool(weights, vocabulary)
 
 		for story in stories:
 			if story.has_ends:
-				parts = ['role', 'means', 'ends']
+				parts = [story.role, story.means, story.ends]
 			else:
-				parts = ['role', 'means']
+				parts = [story.role, story.means]
 
 			for part in parts:
-				for token in eval('story.' + str(part) + '.text'):
-					c = get_case(token)
-					if c in indices:
-						for weight in weights:
-							if weight[0] == c:
-								w = weight[1]
-								break
-					else:
-						w = 0.0
-					weighted_tokens.append(WeightedToken(token, w))
-
-		return weighted_tokens
+				for token in part.text:
+					pool.add(token)
+
+		return pool
 
 class PatternFactory:
-	def __init__(self, onto, prolog, weighted_tokens):
+	def __init__(self, onto, prolog, weighted_tokens, progress=None):
 		self.onto = onto
+		self.progress = progress
 		self.prolog = prolog
 		self.weighted_tokens = weighted_tokens
-		self.sysname = ""
+		self.identifier = None
+		self.system_key = None
 
 	def make_patterns(self, user_stories, threshold):
-		pi = PatternIdentifier(self.weighted_tokens)
-		self.sysname = str.lower(get_case(user_stories[0].system.main))
-		
-		for story in user_stories:
-			pi.identify(story)
-		
-		relationships = self.apply_threshold(pi.relationships, threshold)
+		if not self.identifier:
+			self.identifier = PatternIdentifier(self.weighted_tokens, self.progress)
+		self.system_key = self.weighted_tokens.vocabulary.key(get_case(user_stories[0].system.main))
 
-		self.create(relationships, user_stories, threshold, pi.roles)
+		contribution, lowest, order = self.identify(user_stories)
+		weighted_tokens = self.weighted_tokens.above(threshold) + [wt for wt in contribution.weighted_tokens.values() if wt.weight >= threshold]
+
+		relationships = self.apply_threshold(contribution.relationships, threshold, lowest, order)
+
+		self.create(relationships, user_stories, contribution.roles, weighted_tokens)
 
 		return self.onto
 
-	def apply_threshold(self, relationships, threshold):
-		rel = []
+	def identify(self, stories):
+		"""Identifies the patterns in a set of user stories, and ranks the relationships by their
+		lowest weight, so that the threshold can be applied with a binary search
 
-		for r in relationships:
-			if self.get_lowest_threshold(r) >= threshold:
-				rel.append(r)
-		
-		return rel
+		:param stories: List of user stories
+		:returns: Merged contribution, the sorted lowest weights and the positions of the relationships in that order
+		"""
+		contribution = self.identifier.identify_all(stories)
+		lowest = np.array([self.get_lowest_threshold(r) for r in contribution.relationships], dtype=float)
+		order = np.argsort(lowest, kind='mergesort')
+		return contribution, lowest[order], order
+
+	def apply_threshold(self, relationships, threshold, lowest, order):
+		first = bisect.bisect_left(lowest, threshold)
+		return [relationships[i] for i in np.sort(order[first:])]
 
 	def get_lowest_threshold(self, relationship):
 		wt = self.get_weighted_tokens(relationship)
@@ -244,7 +315,7 @@ class PatternFactory:
 		if wt:		
 			lt = wt[0].weight
 			for w in wt:
-				if str.lower(get_case(w)) != self.sysname and w.weight < lt: # Exclude system name object from filter
+				if w.key != self.system_key and w.weight < lt: # Exclude system name object from filter
 					lt = w.weight
 
 		return lt
@@ -263,7 +334,7 @@ class PatternFactory:
 
 		return wt
 
-	def create(self, relationships, stories, threshold, roles):
+	def create(self, relationships, stories, roles, weighted_tokens):
 		used = []
 
 		for r in relationships:
@@ -293,11 +364,11 @@ class PatternFactory:
 			used.append(pre)
 			used.append(post)
 
-		for wo in self.weighted_tokens:
-			if wo.weight >= threshold:
-				in_stories = self.find_story(wo, stories)
-				for in_story in in_stories:
-					self.onto.get_class_by_name(in_story, wo.case)
+		stories_per_case = self.index_stories(stories)
+
+		for wo in weighted_tokens:
+			for in_story in stories_per_case.get(wo.case, []):
+				self.onto.get_class_by_name(in_story, wo.case)
 
 		for r in roles:
 			self.onto.get_class_by_name(r[0], get_case(r[1]), '', True)
@@ -311,29 +382,106 @@ class PatternFactory:
 	def make_relationship(self, story, pre, rel, post, connector):
 		self.onto.new_relationship(story, pre, connector + rel, post)	
 
-	def find_story(self, w_token, stories):
-		nrs = []
+	def index_stories(self, stories):
+		"""Indexes which user stories contain each case
+
+		:param stories: List of user stories
+		:returns: Dictionary of case to the numbers of the user stories containing it
+		"""
+		index = {}
 		for story in stories:
-			if w_token.case in [get_case(t) for t in story.data]:
-				nrs.append(story.number)
-		return nrs
+			for case in set([get_case(t) for t in story.data]):
+				index.setdefault(case, []).append(story.number)
 
+		return index
 
-class PatternIdentifier:
-	def __init__(self, weighted_tokens):
-		self.weighted_tokens = weighted_tokens
+
+class Contribution:
+	"""Relationships, roles and new weighted tokens that one or more user stories contribute to the
+	ontology. Contributions of user stories can be identified independently and merged in story
+	order, where a weighted token that was new in an earlier user story takes precedence.
+	"""
+	def __init__(self):
 		self.relationships = []
 		self.roles = []
+		self.weighted_tokens = {}
+
+	def merge(self, other):
+		"""Merges two contributions, without changing them
+
+		:param other: Contribution of later user stories
+		:returns: New contribution
+		"""
+		return Contribution().update(self).update(other)
+
+	def update(self, other):
+		"""Adds the contribution of later user stories to this contribution
+
+		:param other: Contribution of later user stories
+		:returns: This contribution
+		"""
+		replaced = {}
+		for text, wt in other.weighted_tokens.items():
+			if text in self.weighted_tokens:
+				replaced[id(wt)] = self.weighted_tokens[text]
+			else:
+				self.weighted_tokens[text] = wt
+
+		if replaced:
+			self.relationships.extend([Contribution.replace(r, replaced) for r in other.relationships])
+			self.roles.extend([Contribution.replace(r, replaced) for r in other.roles])
+		else:
+			self.relationships.extend(other.relationships)
+			self.roles.extend(other.roles)
+
+		return self
+
+	def replace(value, replaced):
+		if type(value) is list:
+			return [Contribution.replace(v, replaced) for v in value]
+		return replaced.get(id(value), value)
+
+
+class PatternIdentifier:
+	def __init__(self, weighted_tokens, progress=None):
+		self.weighted_tokens = weighted_tokens
+		self.progress = progress if progress else Progress()
+		self.by_text = weighted_tokens.by_text
+		self.contributions = {}
+
+	def identify_all(self, stories, mapper=map):
+		"""Identifies the patterns in all user stories
+
+		:param stories: List of user stories
+		:param mapper: Function to map the user stories to their contributions with, e.g. Executor.map
+		:returns: Merged contribution of the user stories
+		"""
+		contributions = self.progress.track("patterns", mapper(self.contribute, stories), len(stories))
+		return functools.reduce(Contribution.update, contributions, Contribution())
+
+	def contribute(self, story):
+		"""Identifies the patterns in a user story, once per user story
+
+		:param story: A user story
+		:returns: Contribution of the user story
+		"""
+		if story.number not in self.contributions:
+			self.contributions[story.number] = self.identify(story)
+		return self.contributions[story.number]
 
 	def identify(self, story):
-		self.identify_compound(story)
-		self.identify_func_role(story)
-		self.identify_subj_dobj(story)
+		contribution = Contribution()
+
+		self.identify_compound(story, contribution)
+		self.identify_func_role(story, contribution)
+		self.identify_subj_dobj(story, contribution)
 		if story.has_ends:
-			self.identify_subj_dobj(story, 'ends')
+			self.identify_subj_dobj(story, contribution, 'ends')
 		self.identify_dobj_conj(story)
 
-	def identify_compound(self, story):
+		return contribution
+
+	def identify_compound(self, story, contribution):
 		compounds = []
 
 		if story.role.functional_role.compound:
@@ -354,25 +502,25 @@ class PatternIdentifier:
 		if compounds:
 			## C5
 			for c in compounds:
-				self.relationships.append([story.number, [self.getwt(c[0]), self.getwt(c[1])], Pattern.parent, self.getwt(c[1])])
+				contribution.relationships.append([story.number, [self.getwt(c[0], contribution), self.getwt(c[1], contribution)], Pattern.parent, self.getwt(c[1], contribution)])
 
 				## R4
 				if c[0].head == c[1]:
-					self.relationships.append([story.number, self.getwt(c[0]), Pattern.compound_has, [self.getwt(c[0]), self.getwt(c[1])], self.getwt(c[1])])
+					contribution.relationships.append([story.number, self.getwt(c[0], contribution), Pattern.compound_has, [self.getwt(c[0], contribution), self.getwt(c[1], contribution)], self.getwt(c[1], contribution)])
 
-	def identify_func_role(self, story):
+	def identify_func_role(self, story, contribution):
 		role = []
 		has_parent = False
 
 		if story.role.functional_role.compound:
 			for c in story.role.functional_role.compound:
-				role.append(self.getwt(c))
+				role.append(self.getwt(c, contribution))
 		else:
-			role.append(self.getwt(story.role.functional_role.main))
+			role.append(self.getwt(story.role.functional_role.main, contribution))
 
-		self.roles.append([story.number, role])
+		contribution.roles.append([story.number, role])
 
-		is_child = self.is_child(role)
+		is_child = self.is_child(role, contribution.relationships)
 		
 		# Checks if the functional role already has a parent, and then makes this parent the child for 'FunctionalRole'
 		if is_child[0]:
@@ -384,7 +532,7 @@ class PatternIdentifier:
 		self.func_role = True			
 
 	## C1, C2, C3, R1, R2
-	def identify_subj_dobj(self, story, part='means'):
+	def identify_subj_dobj(self, story, contribution, part='means'):
 		if part == 'means':
 			fr = self.get_func_role(story)
 		else:
@@ -395,26 +543,29 @@ class PatternIdentifier:
 			else:
 				txtfr = fr
 			
-			if str.lower(txtfr.text) == 'i':
+			if str.lower(txtfr.text) == str.lower(get_pack(story.lang).pronoun):
 				fr = self.get_func_role(story)
 			
-		if eval('story.' + str(part) + '.main_verb.phrase'):
+		main_verb = get_attr(story, part + '.main_verb')
+		main_object = get_attr(story, part + '.main_object')
+
+		if main_verb.phrase:
 			#and (eval('story.' + str(part) + '.main_verb.type') == 'II' or str.lower(eval('story.' + str(part) + '.main_verb.phrase')[1].text) in ['on', 'in', 'by', 'to']):
-			mv = eval('story.' + str(part) + '.main_verb.phrase')
+			mv = main_verb.phrase
 		else:
-			mv = [eval('story.' + str(part) + '.main_verb.main')]
+			mv = [main_verb.main]
 
-		if eval('story.' + str(part) + '.main_object.compound'):
-			do = eval('story.' + str(part) + '.main_object.compound')
+		if main_object.compound:
+			do = main_object.compound
 		else:
-			do = [eval('story.' + str(part) + '.main_object.main')]
+			do = [main_object.main]
 		
 		if type(do[0]) is not list:
-			w_fr = [self.getwt(x) for x in fr]
-			w_mv = [self.getwt(x) for x in mv]
-			w_do = [self.getwt(x) for x in do]
+			w_fr = [self.getwt(x, contribution) for x in fr]
+			w_mv = [self.getwt(x, contribution) for x in mv]
+			w_do = [self.getwt(x, contribution) for x in do]
 
-			self.relationships.append([story.number, w_fr, Pattern.subj_dobj, w_do, w_mv])
+			contribution.relationships.append([story.number, w_fr, Pattern.subj_dobj, w_do, w_mv])
 
 	def identify_dobj_conj(self, story):
 		if story.means.free_form:
@@ -440,11 +591,11 @@ class PatternIdentifier:
 
 		return subj
 
-	def is_child(self, weighted_tokens):
+	def is_child(self, weighted_tokens, relationships):
 		is_child = False
 		children = []
 
-		for r in self.relationships:
+		for r in relationships:
 			if type(r[1]) is list and type(weighted_tokens) is list:
 				case = ""
 				case_w = ""
@@ -466,12 +617,13 @@ class PatternIdentifier:
 
 		return is_child, children	
 
-	def getwt(self, token):
-		for wt in self.weighted_tokens:
-			if str.lower(token.text) == str.lower(wt.token.text):
-				return wt
-		self.weighted_tokens.append(WeightedToken(token, 0.0))
-		return self.getwt(token)
+	def getwt(self, token, contribution):
+		text = str.lower(token.text)
+		if text in self.by_text:
+			return self.by_text[text]
+		if text not in contribution.weighted_tokens:
+			contribution.weighted_tokens[text] = WeightedToken(token, 0.0, self.weighted_tokens.vocabulary)
+		return contribution.weighted_tokens[text]
 		
 
 class Pattern(Enum):
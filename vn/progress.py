@@ -0,0 +1,144 @@
+''' Progress of the stages of a run (mining, matrix, patterns, report), with the number of items
+done, the rate and the estimated time left, as a progress bar or as JSON lines for job runners
+'''
+
+import sys
+import json
+import time
+
+
+class Progress(object):
+	"""Progress reporting that is disabled: the items of a stage are passed through as they are, so
+	that it costs nothing
+	"""
+	def track(self, stage, items, total=None):
+		"""Reports the progress of a stage while its items are iterated
+
+		:param stage: Name of the stage
+		:param items: Items of the stage, e.g. the user stories
+		:param total: Number of items, if items has no length
+		:returns: Iterable of the items
+		"""
+		return items
+
+	def close(self):
+		pass
+
+
+class Telemetry(Progress):
+	"""Progress reporting to one or more outputs (ProgressBar, ProgressLines), which each report at
+	most once per interval and once when a stage is finished
+	"""
+	def __init__(self, outputs):
+		"""
+		:param outputs: List of outputs
+		"""
+		self.outputs = outputs
+
+	def track(self, stage, items, total=None):
+		if total is None:
+			total = len(items)
+		return self.iterate(stage, items, total)
+
+	def iterate(self, stage, items, total):
+		start = time.monotonic()
+		due = [start] * len(self.outputs)
+		done = 0
+
+		for item in items:
+			yield item
+			done += 1
+			now = time.monotonic()
+			for i, output in enumerate(self.outputs):
+				if now >= due[i]:
+					output.report(stage, done, total, now - start, False)
+					due[i] = now + output.interval
+
+		for output in self.outputs:
+			output.report(stage, done, total, time.monotonic() - start, True)
+
+	def close(self):
+		for output in self.outputs:
+			output.close()
+
+
+class ProgressBar(object):
+	"""Progress bar on a terminal, which is redrawn in place"""
+	def __init__(self, out=None, width=30):
+		self.out = out if out else sys.stdout
+		self.width = width
+		self.interval = 0.1
+
+	def report(self, stage, done, total, elapsed, final):
+		fraction = done / total if total else 1.0
+		filled = int(round(self.width * min(fraction, 1.0)))
+		line = "[" + stage + "] |" + "#" * filled + "-" * (self.width - filled) + "| " + '{:>4.0%}'.format(fraction)
+		line += " " + str(done) + "/" + str(total) + "  " + '{:.1f}'.format(rate(done, elapsed)) + "/s"
+		line += "  " + ("in " + clock(elapsed) if final else "ETA " + clock(eta(done, total, elapsed)))
+		self.out.write("\r" + line + ("\n" if final else ""))
+		self.out.flush()
+
+	def close(self):
+		pass
+
+
+class ProgressLines(object):
+	"""Progress as a JSON object per line, e.g.
+	{"stage": "mining", "done": 500, "total": 2000, "elapsed": 4.2, "rate": 119.0, "eta": 12.6, "finished": false}
+	"""
+	def __init__(self, out=None, interval=1.0, close=False):
+		"""
+		:param out: Open file to write the lines to (default: stdout)
+		:param interval: Minimum number of seconds between two lines of a stage
+		:param close: Close the file when the progress is closed
+		"""
+		self.out = out if out else sys.stdout
+		self.interval = interval
+		self.closes = close
+
+	def report(self, stage, done, total, elapsed, final):
+		line = {"stage": stage, "done": done, "total": total, "elapsed": round(elapsed, 3), "rate": round(rate(done, elapsed), 3),
+				"eta": 0.0 if final else round(eta(done, total, elapsed), 3), "finished": final}
+		self.out.write(json.dumps(line) + "\n")
+		self.out.flush()
+
+	def close(self):
+		if self.closes:
+			self.out.close()
+
+
+def get_progress(mode=None, filename=None, interval=1.0):
+	"""
+	:param mode: 'bar', 'lines' or 'auto' (a bar on a terminal, lines otherwise) for progress on the console, or None
+	:param filename: File to write progress lines to, or None
+	:param interval: Minimum number of seconds between two progress lines of a stage
+	:returns: Progress, which is disabled if there is neither a mode nor a file
+	"""
+	outputs = []
+	if mode == 'auto':
+		mode = 'bar' if sys.stdout.isatty() else 'lines'
+	if mode == 'bar':
+		outputs.append(ProgressBar())
+	elif mode == 'lines':
+		outputs.append(ProgressLines(interval=interval))
+	if filename:
+		outputs.append(ProgressLines(open(filename, 'w'), interval, close=True))
+
+	if not outputs:
+		return Progress()
+	return Telemetry(outputs)
+
+def rate(done, elapsed):
+	return done / elapsed if elapsed > 0 else 0.0
+
+def eta(done, total, elapsed):
+	"""
+	:returns: Estimated number of seconds until all items are done, at the rate so far
+	"""
+	if not done:
+		return 0.0
+	return max(0, total - done) * elapsed / done
+
+def clock(seconds):
+	seconds = int(round(seconds))
+	return str(seconds // 3600) + ":" + '{:02d}:{:02d}'.format(seconds // 60 % 60, seconds % 60)
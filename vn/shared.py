@@ -0,0 +1,259 @@
+''' Mined user stories as NumPy records in shared memory, from which the factor matrix is scored and
+filled by worker processes without the spaCy objects (which cannot be pickled).
+
+Only the features of the tokens (their case, part and position) and the marks of the tokens that
+the miner found (functional role, main objects, free form nouns and compounds) are extracted in the
+parent process. The weights and counts are computed from them in the workers.
+'''
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+try:
+	from multiprocessing import shared_memory
+except ImportError:
+	# Python < 3.8: the records are kept in the process itself
+	shared_memory = None
+
+# Parts of a user story that a token record is in, where DATA is the complete user story
+ROLE, MEANS, ENDS, DATA = range(4)
+
+# Bit of the token of a user story that is a verb
+VERB = 1 << 6
+
+# Bits of what a token of a user story is (see Matrix.marks). The main object and noun bits of the
+# ends are only set if the ends have a free form.
+FR_MAIN, FR_COMPOUND, MO_MAIN, MO_COMPOUND, MEANS_NOUN, EO_MAIN, EO_COMPOUND, EO_PHRASE, ENDS_NOUN = [1 << b for b in range(9)]
+
+# Record per token: the story (column of the factor matrix), the case (row), the part, the column of the
+# role/means/ends matrix, its character offset, whether it is a verb, and the position of the token in
+# the document of the user story
+TOKEN = np.dtype([('story', np.int32), ('case', np.int32), ('part', np.int8), ('column', np.int32),
+				  ('idx', np.int64), ('flags', np.uint8), ('i', np.int32)])
+
+# Record per marked token of a user story: the key of the story and character offset (see key), and
+# its marks. Tokens are marked by offset, as tokens are the same if they start at the same character.
+MARK = np.dtype([('key', np.int64), ('bits', np.uint16)])
+
+
+def key(story, idx):
+	"""
+	:param story: Story (or array of stories)
+	:param idx: Character offset (or array of offsets) of a token
+	:returns: Key of the token in the marks
+	"""
+	return (np.asarray(story, dtype=np.int64) << 32) | idx
+
+
+class SharedArray(object):
+	"""NumPy array in a block of shared memory, which other processes attach to by name. Without
+	multiprocessing.shared_memory, it is an ordinary array.
+	"""
+	def __init__(self, shape, dtype, name=None):
+		"""
+		:param shape: Shape of the array
+		:param dtype: NumPy data type
+		:param name: Name of the block of an existing array to attach to, or None to create a new array filled with zeros
+		"""
+		self.shape = tuple(shape)
+		self.dtype = np.dtype(dtype)
+		self.memory = None
+
+		if shared_memory is None:
+			self.array = np.zeros(self.shape, dtype=self.dtype)
+			return
+
+		size = max(1, int(np.prod(self.shape)) * self.dtype.itemsize)
+		self.memory = shared_memory.SharedMemory(name=name, create=name is None, size=size)
+		self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=self.memory.buf)
+		if name is None:
+			self.array.fill(0)
+
+	@property
+	def spec(self):
+		"""
+		:returns: Arguments to attach to the array from another process
+		"""
+		return (self.shape, self.dtype, self.memory.name)
+
+	def close(self, unlink=False):
+		self.array = None
+		if self.memory is not None:
+			self.memory.close()
+			if unlink:
+				self.memory.unlink()
+			self.memory = None
+
+
+class SharedCorpus(object):
+	"""Token records of mined user stories, ordered by user story, from which the factor matrix, the
+	count matrix and the role/means/ends matrix are filled
+
+	The matrices are filled per range of user stories, so that each worker process writes its own
+	columns of the (shared) factor and role/means/ends matrices.
+	"""
+	def __init__(self, records, marks, stories, columns):
+		"""
+		:param records: List of TOKEN tuples, ordered by story
+		:param marks: Dictionary of key (see key) to the marks of the token
+		:param stories: Number of user stories
+		:param columns: Number of columns of the role/means/ends matrix
+		"""
+		self.stories = stories
+		self.columns = columns
+		self.tokens = SharedArray((len(records),), TOKEN)
+		self.tokens.array[:] = np.array(records, dtype=TOKEN)
+		self.marks = SharedArray((len(marks),), MARK)
+		self.marks.array[:] = np.array(sorted(marks.items()), dtype=MARK)
+
+	def fill(self, cases, values, workers=1):
+		"""Scores the tokens and fills the matrices, spread over worker processes if shared memory
+		is available
+
+		:param cases: Number of cases (rows of the matrices)
+		:param values: Weights of the functional role, main object, free form means noun, free form ends noun and compounds
+		:param workers: Number of worker processes
+		:returns: Factor matrix, role/means/ends matrix and count matrix as NumPy arrays
+		"""
+		factor = SharedArray((cases, self.stories), np.float64)
+		rme = SharedArray((cases, self.columns), np.int64)
+		counts = np.zeros((cases, 6), dtype=np.int64)
+
+		try:
+			if workers > 1 and shared_memory is not None and self.stories > 1:
+				bounds = np.linspace(0, self.stories, min(workers, self.stories) + 1).astype(int)
+				specs = [self.tokens.spec, self.marks.spec, factor.spec, rme.spec]
+				jobs = len(bounds) - 1
+				with ProcessPoolExecutor(max_workers=jobs) as executor:
+					for part in executor.map(fill_shared, [specs] * jobs, [values] * jobs, bounds[:-1], bounds[1:]):
+						counts += part
+			else:
+				counts += fill_columns(self.tokens.array, self.marks.array, factor.array, rme.array, values, 0, self.stories)
+
+			return np.array(factor.array), np.array(rme.array), counts
+		finally:
+			factor.close(unlink=True)
+			rme.close(unlink=True)
+
+	def distinct_tokens(self, cases):
+		"""Counts the different tokens of each case in the user stories, where each user story has
+		its own tokens, also if it is a duplicate that shares the document of another
+
+		:param cases: Number of cases
+		:returns: Number of tokens per case, and whether the (last) token of each case is a verb
+		"""
+		tokens = self.tokens.array
+		tokens = tokens[(tokens['part'] == DATA) & (tokens['case'] >= 0)]
+		tokens = tokens[np.lexsort((tokens['i'], tokens['story'], tokens['case']))]
+
+		first = np.ones(len(tokens), dtype=bool)
+		for field in ['case', 'story', 'i']:
+			first[1:] &= tokens[field][1:] == tokens[field][:-1]
+		first[1:] = ~first[1:]
+		tokens = tokens[first]
+
+		distinct = np.bincount(tokens['case'], minlength=cases)
+		verb = np.zeros(cases, dtype=bool)
+		verb[tokens['case']] = tokens['flags'] & VERB > 0
+		return distinct, verb
+
+	def close(self):
+		self.tokens.close(unlink=True)
+		self.marks.close(unlink=True)
+
+
+def get_marks(tokens, marks):
+	"""
+	:param tokens: Array of TOKEN records
+	:param marks: Array of MARK records, ordered by key
+	:returns: Marks of each token
+	"""
+	keys = key(tokens['story'], tokens['idx'])
+	if not len(marks):
+		return np.zeros(len(tokens), dtype=np.uint16)
+	pos = np.minimum(np.searchsorted(marks['key'], keys), len(marks) - 1)
+	return np.where(marks['key'][pos] == keys, marks['bits'][pos], 0).astype(np.uint16)
+
+def score(part, bits, values):
+	"""Weights that tokens of the role, means or ends add to the factor matrix
+
+	:param part: Part of the user story (ROLE, MEANS or ENDS)
+	:param bits: Marks of the tokens
+	:param values: Weights of the functional role, main object, free form means noun, free form ends noun and compounds
+	:returns: Array of weights
+	"""
+	func_role, main_obj, means_noun, ends_noun, compound = values
+
+	# A token that is the main of a phrase is not counted as a compound of it
+	if part == ROLE:
+		return np.where(bits & FR_MAIN > 0, func_role, np.where(bits & FR_COMPOUND > 0, func_role * compound, 0.0))
+	elif part == MEANS:
+		weight = np.where(bits & MO_MAIN > 0, main_obj, np.where(bits & MO_COMPOUND > 0, main_obj * compound, 0.0))
+		return weight + np.where(bits & MEANS_NOUN > 0, means_noun, 0.0)
+	return np.where(bits & (EO_MAIN | EO_COMPOUND | ENDS_NOUN) > 0, ends_noun, 0.0)
+
+def count_flags(bits):
+	"""
+	:param bits: Marks of the tokens
+	:returns: For each column of the count matrix, which of the tokens count in it
+	"""
+	main = lambda b: bits & b > 0
+	compound = lambda b, c: (bits & c > 0) & (bits & b == 0)
+	return [main(FR_MAIN), # Functional Role
+			compound(FR_MAIN, FR_COMPOUND), # Functional Role Compound
+			main(MO_MAIN), # Main Object
+			compound(MO_MAIN, MO_COMPOUND), # Main Object Compound
+			main(MEANS_NOUN), # Means Free Form Noun
+			main(EO_MAIN | EO_COMPOUND | EO_PHRASE | ENDS_NOUN)] # Ends Free Form Noun
+
+def fill_columns(tokens, marks, factor, rme, values, start, end):
+	"""Scores the tokens of a range of user stories and fills their columns
+
+	:param tokens: Array of TOKEN records, ordered by story
+	:param marks: Array of MARK records, ordered by key
+	:param factor: Factor matrix (cases by stories) to add the weights to
+	:param rme: Role/means/ends matrix (cases by columns) to mark the parts of the cases in
+	:param values: Weights of the functional role, main object, free form means noun, free form ends noun and compounds
+	:param start: First user story
+	:param end: User story after the last
+	:returns: Count matrix (cases by count columns) of the user stories
+	"""
+	first, last = np.searchsorted(tokens['story'], [start, end])
+	tokens = tokens[first:last]
+	tokens = tokens[tokens['case'] >= 0]
+	bits = get_marks(tokens, marks)
+
+	weights = np.zeros(len(tokens), dtype=np.float64)
+	for part in [ROLE, MEANS, ENDS]:
+		of_part = tokens['part'] == part
+		weights[of_part] = score(part, bits[of_part], values)
+
+	parts = tokens['part'] != DATA
+	# Added one at a time in the order of the tokens, like the weights were added to the DataFrame
+	np.add.at(factor, (tokens['case'][parts], tokens['story'][parts]), weights[parts])
+	columns = parts & (tokens['column'] >= 0)
+	rme[tokens['case'][columns], tokens['column'][columns]] = 1
+
+	data = tokens['part'] == DATA
+	counts = np.zeros((factor.shape[0], 6), dtype=np.int64)
+	for column, counted in enumerate(count_flags(bits[data])):
+		np.add.at(counts[:, column], tokens['case'][data][counted], 1)
+	return counts
+
+def fill_shared(specs, values, start, end):
+	"""Scores and fills the columns of a range of user stories in a worker process
+
+	:param specs: Specs of the shared token records, marks, factor matrix and role/means/ends matrix
+	:param values: Weights of the functional role, main object, free form means noun, free form ends noun and compounds
+	:param start: First user story
+	:param end: User story after the last
+	:returns: Count matrix of the user stories
+	"""
+	arrays = [SharedArray(shape, dtype, name) for shape, dtype, name in specs]
+	try:
+		tokens, marks, factor, rme = [a.array for a in arrays]
+		return fill_columns(tokens, marks, factor, rme, values, start, end)
+	finally:
+		for a in arrays:
+			a.close()
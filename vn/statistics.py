@@ -1,41 +1,136 @@
+import collections
+import numpy as np
+import pandas as pd
+from spacy.attrs import POS
+from spacy.parts_of_speech import NOUN, VERB
 from vn.utility import *
 
 class Statistics:
-	def to_stats_array(stories):
-		stats = []
-		sent_stats = []
-
-		if stories:
-			header = ['US_ID', 'User_Story', 'Words', 'Verbs', 'Nouns', 'NPs', 'Ind_R', 'Ind_M', 'Ind_E', 'FR_Type', 'MV_Type', 'DO_Type']
-			stats.append(header)
-			sent_header = ['US_ID', 'Role_NP', 'Role_Struct', 'Role_Struct_Detail', 'Means_NP', 'Means_Struct', 'Means_Struct_Detail', 'Ends_NP', 'Ends_Struct', 'Ends_Struct_Detail']
-			sent_stats.append(sent_header)
-
-		for us in stories:
-			stats.append([us.number, 
-						  us.text, 
-						  us.stats.words, 
-						  us.stats.verbs, 
-						  us.stats.nouns,
-						   us.stats.noun_phrases, 
-						   us.stats.indicators.role, 
-						   us.stats.indicators.means, 
-						   us.stats.indicators.ends, 
-						   us.stats.fr_type, 
-						   us.stats.mv_type, 
-						   us.stats.do_type])
-			sent_stats.append([us.number, 
-								text(us.stats.role.nps), 
-								text(us.stats.role.general), 
-								text(us.stats.role.detail), 
-								text(us.stats.means.nps), 
-								text(us.stats.means.general), 
-								text(us.stats.means.detail), 
-								text(us.stats.means.nps), 
-								text(us.stats.means.general), 
-								text(us.stats.means.detail)])
-
-		return stats, sent_stats
+	def to_stats_frame(stories):
+		"""Gets the statistics of all user stories, column by column
+
+		:param stories: List of user stories
+		:returns: DataFrames of the general statistics and of the sentence statistics, indexed by US_ID
+		"""
+		stats = pd.DataFrame({
+			'US_ID': [us.number for us in stories],
+			'User_Story': [us.text for us in stories],
+			'Words': np.array([us.stats.words for us in stories], dtype=np.int64),
+			'Verbs': np.array([us.stats.verbs for us in stories], dtype=np.int64),
+			'Nouns': np.array([us.stats.nouns for us in stories], dtype=np.int64),
+			'NPs': np.array([us.stats.noun_phrases for us in stories], dtype=np.int64),
+			'Ind_R': [us.stats.indicators.role for us in stories],
+			'Ind_M': [us.stats.indicators.means for us in stories],
+			'Ind_E': [us.stats.indicators.ends for us in stories],
+			'FR_Type': [us.stats.fr_type for us in stories],
+			'MV_Type': [us.stats.mv_type for us in stories],
+			'DO_Type': [us.stats.do_type for us in stories]},
+			columns=['US_ID', 'User_Story', 'Words', 'Verbs', 'Nouns', 'NPs', 'Ind_R', 'Ind_M', 'Ind_E', 'FR_Type', 'MV_Type', 'DO_Type'])
+
+		sent_stats = pd.DataFrame({
+			'US_ID': [us.number for us in stories],
+			'Role_NP': [text(us.stats.role.nps) for us in stories],
+			'Role_Struct': [text(us.stats.role.general) for us in stories],
+			'Role_Struct_Detail': [text(us.stats.role.detail) for us in stories],
+			'Means_NP': [text(us.stats.means.nps) for us in stories],
+			'Means_Struct': [text(us.stats.means.general) for us in stories],
+			'Means_Struct_Detail': [text(us.stats.means.detail) for us in stories],
+			'Ends_NP': [text(us.stats.ends.nps) for us in stories],
+			'Ends_Struct': [text(us.stats.ends.general) for us in stories],
+			'Ends_Struct_Detail': [text(us.stats.ends.detail) for us in stories]},
+			columns=['US_ID', 'Role_NP', 'Role_Struct', 'Role_Struct_Detail', 'Means_NP', 'Means_Struct', 'Means_Struct_Detail', 'Ends_NP', 'Ends_Struct', 'Ends_Struct_Detail'])
+
+		return stats.set_index('US_ID'), sent_stats.set_index('US_ID')
+
+class Summary:
+	"""Distributions of the statistics of a user story set, which are updated one user story at a
+	time, so that the user stories themselves do not have to be kept
+	"""
+	def __init__(self):
+		self.stories = 0
+		self.failed = 0
+		self.failures = collections.Counter()
+		self.indicators = {'role': collections.Counter(), 'means': collections.Counter(), 'ends': collections.Counter()}
+		self.mv_types = collections.Counter()
+		self.words = collections.Counter()
+		self.nouns = collections.Counter()
+		self.verbs = collections.Counter()
+
+	def add(self, story):
+		"""Adds the statistics of a counted user story
+
+		:param story: A user story
+		"""
+		self.stories += 1
+		self.indicators['role'][story.stats.indicators.role] += 1
+		self.indicators['means'][story.stats.indicators.means] += 1
+		self.indicators['ends'][story.stats.indicators.ends] += 1
+		self.mv_types[story.stats.mv_type] += 1
+		self.words[story.stats.words] += 1
+		self.nouns[story.stats.nouns] += 1
+		self.verbs[story.stats.verbs] += 1
+
+	def add_failure(self, err):
+		"""Adds a user story that could not be mined
+
+		:param err: The ValueError raised by the StoryMiner, with the error code as second argument
+		"""
+		self.failed += 1
+		self.failures[err.args[1] if len(err.args) > 1 else -1] += 1
+
+	def merge(self, other):
+		"""Adds the distributions of another summary, e.g. of another user story set
+
+		:param other: Summary
+		:returns: This summary
+		"""
+		self.stories += other.stories
+		self.failed += other.failed
+		self.failures.update(other.failures)
+		for part in self.indicators:
+			self.indicators[part].update(other.indicators[part])
+		self.mv_types.update(other.mv_types)
+		self.words.update(other.words)
+		self.nouns.update(other.nouns)
+		self.verbs.update(other.verbs)
+		return self
+
+	def mean(self, histogram):
+		if not self.stories:
+			return 0.0
+		return sum(value * count for value, count in histogram.items()) / self.stories
+
+	def to_rows(self):
+		"""Gets the summary as rows of statistic, value and number of user stories
+
+		:returns: List of rows, starting with a header
+		"""
+		rows = [['Statistic', 'Value', 'User_Stories']]
+		rows.append(['Total', 'Success', self.stories])
+		rows.append(['Total', 'Failed', self.failed])
+		for code, count in sorted(self.failures.items()):
+			rows.append(['Failure_Code', code, count])
+		for part in ['role', 'means', 'ends']:
+			for indicator, count in self.indicators[part].most_common():
+				rows.append(['Ind_' + part[0].upper(), indicator, count])
+		for mv_type, count in self.mv_types.most_common():
+			rows.append(['MV_Type', mv_type, count])
+		for name in ['words', 'nouns', 'verbs']:
+			histogram = getattr(self, name)
+			rows.append(['Mean_' + name.capitalize(), round(self.mean(histogram), 5), self.stories])
+			for value, count in sorted(histogram.items()):
+				rows.append([name.capitalize(), value, count])
+		return rows
+
+	def toJSON(self):
+		return {"stories": self.stories,
+				"failed": self.failed,
+				"failures": {str(code): count for code, count in self.failures.items()},
+				"indicators": {part: dict(counts) for part, counts in self.indicators.items()},
+				"mv_types": dict(self.mv_types),
+				"words": {str(value): count for value, count in sorted(self.words.items())},
+				"nouns": {str(value): count for value, count in sorted(self.nouns.items())},
+				"verbs": {str(value): count for value, count in sorted(self.verbs.items())}}
 
 class Counter:
 	def count(self, story):
@@ -46,19 +141,42 @@ class Counter:
 		#story = self.get_structure(story)
 		return story
 
+	def count_all(self, stories):
+		"""Counts all user stories at once, using the part-of-speech arrays of their documents
+
+		:param stories: List of user stories
+		:returns: List of user stories
+		"""
+		if not stories:
+			return stories
+
+		arrays = [story.data.to_array([POS]) for story in stories]
+		lengths = np.array([len(a) for a in arrays])
+		pos = np.concatenate(arrays)[:, 0]
+		owner = np.repeat(np.arange(len(stories)), lengths)
+		nouns = np.bincount(owner, weights=(pos == NOUN), minlength=len(stories))
+		verbs = np.bincount(owner, weights=(pos == VERB), minlength=len(stories))
+
+		for i, story in enumerate(stories):
+			story.stats.words += int(lengths[i])
+			story.stats.nouns += int(nouns[i])
+			story.stats.verbs += int(verbs[i])
+			story = self.count_nps(story)
+			story = self.count_indicators(story)
+			story = self.get_types(story)
+
+		return stories
+
 	def count_basic(self, story):
-		for token in story.data:
-			story.stats.words += 1
-			if token.pos_ == "NOUN":
-				story.stats.nouns += 1
-			if token.pos_ == "VERB":
-				story.stats.verbs += 1
+		pos = story.data.to_array([POS])[:, 0]
+		story.stats.words += len(pos)
+		story.stats.nouns += int(np.count_nonzero(pos == NOUN))
+		story.stats.verbs += int(np.count_nonzero(pos == VERB))
 
 		return story
 
 	def count_nps(self, story):
-		for chunk in story.data.noun_chunks:
-			story.stats.noun_phrases += 1		
+		story.stats.noun_phrases += sum(1 for chunk in story.data.noun_chunks)
 
 		return story
 
@@ -66,9 +184,9 @@ class Counter:
 		if story.role.indicator:
 			story.stats.indicators.role = str.lower(story.role.indicator)
 		if story.means.indicator:
-			story.stats.indicators.means = str.lower(story.role.indicator)
+			story.stats.indicators.means = str.lower(story.means.indicator)
 		if story.ends.indicator:
-			story.stats.indicators.ends = str.lower(story.role.indicator)
+			story.stats.indicators.ends = str.lower(story.ends.indicator)
 
 		return story
 
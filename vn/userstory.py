@@ -1,5 +1,6 @@
-import json
+import copy
 from vn.statistics import UserStoryStatistics
+from vn.utility import tokens_json
 
 class UserStory(object):
 	def __init__(self, nr, text, no_punct):
@@ -14,12 +15,28 @@ class UserStory(object):
 		self.free_form = []
 		self.system = WithMain()
 		self.has_ends = False
+		self.lang = "en"
 		self.stats = UserStoryStatistics()
 
 	def toJSON(self):
+		story = {"number": self.number, "text": self.text, "sentence": self.sentence, "iloc": self.iloc, "has_ends": self.has_ends, "role": self.role.toJSON(), "means": self.means.toJSON()}
 		if self.has_ends:
-			{"number": self.number, "text": self.text, "iloc": self.iloc, "role": self.role.toJSON(), "means": self.means.toJSON(), "ends": self.ends.toJSON()}
-		return {"number": self.number, "text": self.text, "iloc": self.iloc, "role": self.role.toJSON(), "means": self.means.toJSON()}
+			story["ends"] = self.ends.toJSON()
+		return story
+
+	def clone(self, nr, text):
+		"""Copies a mined user story for a duplicate with another ID, which shares the mined parts but
+		has its own statistics
+
+		:param nr: The user story ID of the duplicate
+		:param text: The user story text of the duplicate
+		:returns: A new user story object
+		"""
+		story = copy.copy(self)
+		story.number = nr
+		story.text = text
+		story.stats = UserStoryStatistics()
+		return story
 
 	def txtnr(self):
 		return "US" + str(self.number)
@@ -55,15 +72,37 @@ class FreeFormUSPart(UserStoryPart):
 		self.compounds = []
 		self.subject = WithPhrase()
 
+	def toJSON(self):
+		part = UserStoryPart.toJSON(self)
+		part.update({"simplified": self.simplified,
+					 "main_verb": self.main_verb.toJSON(),
+					 "main_object": self.main_object.toJSON(),
+					 "free_form": tokens_json(self.free_form),
+					 "verbs": tokens_json(self.verbs),
+					 "phrasal_verbs": tokens_json(self.phrasal_verbs),
+					 "nouns": tokens_json(self.nouns),
+					 "proper_nouns": tokens_json(self.proper_nouns),
+					 "noun_phrases": tokens_json(self.noun_phrases),
+					 "compounds": tokens_json(self.compounds)})
+		return part
+
 class Role(UserStoryPart):
 	def __init__(self):
 		self.functional_role = WithPhrase()
 
+	def toJSON(self):
+		part = UserStoryPart.toJSON(self)
+		part["functional_role"] = self.functional_role.toJSON()
+		return part
+
 class Means(FreeFormUSPart):
 	pass
 
 class Ends(FreeFormUSPart):
-	pass
+	def toJSON(self):
+		part = FreeFormUSPart.toJSON(self)
+		part["subject"] = self.subject.toJSON()
+		return part
 
 class WithMain(object):
 	def __init__(self):
@@ -74,3 +113,6 @@ class WithPhrase(WithMain):
 		self.phrase = []
 		self.compound = []
 		self.type = ""
+
+	def toJSON(self):
+		return {"main": tokens_json(self.main), "phrase": tokens_json(self.phrase), "compound": tokens_json(self.compound), "type": self.type}
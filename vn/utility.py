@@ -1,11 +1,25 @@
 import re
+import sys
 import string
+import functools
+import threading
+import numpy as np
+from array import array
 from spacy.tokens.token import Token
 
 ### General
 def flatten(l):
 	return [item for sublist in l for item in sublist]
 
+def get_attr(obj, path):
+	""" Gets a (nested) attribute, e.g. get_attr(story, 'means.main_object')
+
+	:param obj: Object
+	:param path: Attribute names separated by dots
+	:returns: Value of the attribute
+	"""
+	return functools.reduce(getattr, path.split('.'), obj)
+
 def is_sublist(subli, li):
 	""" Sees if X is a sublist of Y
 
@@ -33,11 +47,14 @@ def is_exact_sublist(subli, li):
 def remove_punct(str):
 	return re.sub(r"[,!?\.]", '', str).strip()
 
+def normalize(str):
+	return ' '.join(remove_punct(str).split())
+
 def text(a_list):
 	return " ".join(str(x) for x in a_list)
 
 def t(li):
-	if type(li) is list:
+	if isinstance(li, list):
 		return text(get_tokens(li))
 	return li.text
 
@@ -73,6 +90,9 @@ def occurence_list(li):
 		return ', '.join(res)
 	return "Does not occur, deducted"
 
+def pos_tags(doc):
+	return [[token.text, token.pos_, token.tag_] for token in doc]
+
 def is_us(cl):
 	if cl.name.startswith("US") or cl.name == 'UserStory':
 		return True
@@ -82,7 +102,7 @@ def is_us(cl):
 
 ### NLP
 def get_case(t):
-	if type(t) is Token:
+	if type(t) is Token or type(t) is TokenRecord:
 		if str.lower(t.text) == "i":  # quickfix for https://github.com/explosion/spaCy/issues/962
 			return "I"
 		if 'd' in t.shape_ or 'x' not in t.shape_ or t.shape_[:2] == 'xX':			
@@ -96,6 +116,15 @@ def get_case(t):
 		return ' '.join([get_case(cc) for cc in t])
 	return t
 
+def tokens_json(tree):
+	"""Converts a token, or a (nested) list of tokens, to JSON serializable token indices and texts
+	"""
+	if type(tree) is Token or type(tree) is TokenRecord:
+		return {"i": tree.i, "text": tree.text}
+	elif tree is None or isinstance(tree, (str, int, float)):
+		return tree
+	return [tokens_json(t) for t in tree]
+
 def get_tokens(tree):
 	return [t.text for t in tree]
 
@@ -134,13 +163,236 @@ def is_dobj(token):
 	return False
 
 
+class TokenList(list):
+	"""List of tokens that keeps the set of their character offsets, so that checking if a token is in
+	the list takes constant time. Like spaCy tokens, tokens are the same if they start at the same
+	character. The list is not meant to be changed after it is created.
+	"""
+	def __init__(self, tokens=()):
+		super().__init__(tokens)
+		self.idx = frozenset(token.idx for token in self)
+
+	def __contains__(self, token):
+		return getattr(token, 'idx', None) in self.idx
+
+
+class TokenRecord(object):
+	"""Attributes of a spaCy token that are used after mining, which are kept when its document is
+	released (see vn.memory). Tokens are the same if they are at the same position of the same
+	document record, which for the tokens of a document is the same as starting at the same
+	character, like spaCy tokens.
+	"""
+	__slots__ = ('doc', 'i', 'idx', 'text', 'whitespace_', 'lemma_', 'shape_', 'pos_', 'tag_', 'dep_', 'head_i')
+
+	def __init__(self, token):
+		"""
+		:param token: spaCy token
+		"""
+		self.doc = None
+		self.i = token.i
+		self.idx = token.idx
+		self.text = token.text
+		self.whitespace_ = token.whitespace_
+		# The tags repeat over all tokens, so they are stored once
+		self.lemma_ = sys.intern(token.lemma_)
+		self.shape_ = sys.intern(token.shape_)
+		self.pos_ = sys.intern(token.pos_)
+		self.tag_ = sys.intern(token.tag_)
+		self.dep_ = sys.intern(token.dep_)
+		self.head_i = token.head.i
+
+	@property
+	def head(self):
+		return self.doc[self.head_i]
+
+	def __eq__(self, other):
+		if isinstance(other, TokenRecord):
+			return self.doc is other.doc and self.i == other.i
+		return NotImplemented
+
+	def __hash__(self):
+		return hash((id(self.doc), self.i))
+
+	def __len__(self):
+		return len(self.text)
+
+	def __str__(self):
+		return self.text
+
+	def __repr__(self):
+		return self.text
+
+
+class DocRecord(tuple):
+	"""Token records of a released spaCy document, or of a span of it (see vn.memory)
+	"""
+	__slots__ = ()
+
+	def __getitem__(self, i):
+		if isinstance(i, slice):
+			return DocRecord(tuple.__getitem__(self, i))
+		return tuple.__getitem__(self, i)
+
+	@property
+	def text(self):
+		if not self:
+			return ""
+		text = ''.join(token.text + token.whitespace_ for token in self)
+		return text[:len(text) - len(self[-1].whitespace_)]
+
+	def __str__(self):
+		return self.text
+
+	def __repr__(self):
+		return self.text
+
+
+class Vocabulary(object):
+	"""Integer ids of the cases (terms) of a set of user stories, which are assigned once, so that
+	terms are compared as integers instead of strings
+
+	Next to its id, each case has a key that it shares with the cases that only differ in
+	capitalization, as class names in the ontology are compared regardless of capitalization. The
+	key is assigned along with the id, so that it is looked up by id instead of lowercasing the case
+	again. Names that are not cases, such as those of classes, get a key without an id, so that the
+	ids remain the rows of the matrices. Ids and keys can be assigned from multiple threads.
+	"""
+	def __init__(self, cases=()):
+		"""
+		:param cases: Cases to assign the first ids to, in order
+		"""
+		self.cases = []
+		self.ids = {}
+		self.keys = {}
+		self.case_keys = []
+		self.lock = threading.Lock()
+
+		for case in cases:
+			self.add(case)
+
+	def __len__(self):
+		return len(self.cases)
+
+	def __getitem__(self, i):
+		return self.cases[i]
+
+	def add(self, case):
+		"""
+		:param case: Case
+		:returns: Id of the case, which is assigned if it is new
+		"""
+		if case not in self.ids:
+			with self.lock:
+				if case not in self.ids:
+					self.case_keys.append(self.keys.setdefault(str.lower(case), len(self.keys)))
+					self.cases.append(case)
+					self.ids[case] = len(self.cases) - 1
+		return self.ids[case]
+
+	def get(self, case, default=-1):
+		"""
+		:param case: Case
+		:returns: Id of the case, or the default if it has none
+		"""
+		return self.ids.get(case, default)
+
+	def key(self, case):
+		"""
+		:param case: Case or name
+		:returns: Key of the case regardless of capitalization, which is assigned if it is new
+		"""
+		i = self.ids.get(case)
+		if i is not None:
+			return self.case_keys[i]
+
+		lower = str.lower(case)
+		if lower not in self.keys:
+			with self.lock:
+				self.keys.setdefault(lower, len(self.keys))
+		return self.keys[lower]
+
+	def get_key(self, case, default=-1):
+		"""
+		:param case: Case or name
+		:returns: Key of the case regardless of capitalization, or the default if it has none
+		"""
+		i = self.ids.get(case)
+		if i is not None:
+			return self.case_keys[i]
+		return self.keys.get(str.lower(case), default)
+
+
 class WeightedToken(object):
-	def __init__(self, token, weight):
+	def __init__(self, token, weight, vocabulary=None):
+		"""
+		:param token: Token
+		:param weight: Weight of its case
+		:param vocabulary: Vocabulary to get the key of its case from
+		"""
 		self.token = token
 		self.case = get_case(token)
+		self.key = vocabulary.key(self.case) if vocabulary is not None else None
 		self.weight = weight
 
 
+class WeightedTokenPool(object):
+	"""Weighted tokens with one entry per case, in order of first occurrence
+
+	The occurrences are kept as the position of their entry, and each lowercased token text refers
+	to the entry of its first occurrence.
+	"""
+	def __init__(self, weights, vocabulary=None):
+		"""
+		:param weights: List of [case, weight], where the case is its id in the vocabulary or the
+			case itself, and the first weight of a case is used
+		:raises ValueError: If a case is an id, but the vocabulary is not given
+		:param vocabulary: Vocabulary of the cases, e.g. of the matrices (default: a new vocabulary)
+		"""
+		self.vocabulary = vocabulary if vocabulary is not None else Vocabulary()
+		self.weights = {}
+		for case, weight in weights:
+			if isinstance(case, str):
+				case = self.vocabulary.add(case)
+			elif vocabulary is None:
+				# Ids of another vocabulary would attach the weights to the wrong cases
+				raise ValueError("The weights of case ids need the vocabulary of the ids")
+			self.weights.setdefault(case, weight)
+		self.entries = []
+		self.index = {}
+		self.by_text = {}
+		self.occurrences = array('I')
+
+	def __len__(self):
+		return len(self.entries)
+
+	def __iter__(self):
+		return iter(self.entries)
+
+	def add(self, token):
+		"""Adds an occurrence of a token
+
+		:param token: Token
+		:returns: The weighted token of its case
+		"""
+		i = self.vocabulary.add(get_case(token))
+		if i not in self.index:
+			self.index[i] = len(self.entries)
+			self.entries.append(WeightedToken(token, self.weights.get(i, 0.0), self.vocabulary))
+
+		entry = self.entries[self.index[i]]
+		self.by_text.setdefault(str.lower(token.text), entry)
+		self.occurrences.append(self.index[i])
+		return entry
+
+	def above(self, threshold):
+		"""
+		:param threshold: Minimum weight
+		:returns: The weighted tokens with at least the minimum weight, in order of first occurrence
+		"""
+		weights = np.array([wt.weight for wt in self.entries], dtype=float)
+		return [self.entries[i] for i in np.flatnonzero(weights >= threshold)]
+
+
 class Printer:
 	def print_head(text):
 		print("\n\n////////////////////////////////////////////////")
@@ -185,6 +437,14 @@ class Printer:
 					pnounstext = " ( Proper: " + str(get_tokens(eval(p + 'proper_nouns'))) + ")"
 				print("    Nouns:", get_tokens(eval(p + 'nouns')), pnounstext)
 
+	def print_memory(peak, start, stories):
+		if peak is None:
+			print("Peak memory: unknown (not measured on this platform)")
+			return
+		print("Peak memory:", round(peak / 2**20, 1), "MB (" + str(round(start / 2**20, 1)), "MB before mining)")
+		if stories:
+			print("Peak memory growth per 10,000 User Stories:", round((peak - start) / 2**20 * 10000 / stories, 1), "MB")
+
 	def print_details(fail, success, nlp_time, parse_time, matr_time, gen_time, stats_time):
 		total = success + fail
 		if success is not 0:
@@ -226,10 +486,13 @@ class Printer:
 			print(chunk.root.head.text, " <-- ", chunk.text)
 		print("")
 
-	def print_stats(stats, detail):
+	def print_stats(stats, detail, summary=None):
 		if detail:
 			print("\n")
 			Printer.print_subhead("DETAILS")
+			if hasattr(stats, 'reset_index'):
+				stats = stats.reset_index()
+				stats = [list(stats.columns)] + stats.values.tolist()
 			for r in stats:
 				outline = ""
 				for s in r:
@@ -238,6 +501,9 @@ class Printer:
 
 		print("\n")		
 		Printer.print_subhead("SUMMARY")
+		if summary:
+			for r in summary.to_rows()[1:]:
+				print(str(r[0]) + ":", r[1], "(" + str(r[2]) + ")")
 
 	def print_gen_settings(matrix, base, threshold):
 		Printer.print_head("ONTOLOGY GENERATOR SETTINGS")